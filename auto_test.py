@@ -13,8 +13,31 @@ import subprocess
 import shutil
 import mesh_generator
 import copy
+import math
+import itertools
+import argparse
+import threading
+import queue
+import hashlib
+import re
+import signal
+import fnmatch
+import tarfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
+# Sobol序列采样依赖scipy，未安装时不能使用sobol采样策略
+try:
+    from scipy.stats import qmc
+except ImportError:
+    qmc = None
+
+# zstd打包依赖zstandard，未安装时不能使用zstd格式
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 # 创建日志记录器
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -36,6 +59,140 @@ test_summary_file_path = ""
 test_details_file = ""
 current_time = ""
 
+# 并发调度配置：本机可用于求解的总核数，以及单个case使用的mpi进程数
+total_cores = 64
+process_num = 64
+
+# 自动选择进程数：开启后process_num作为进程数上限，按网格数和历史求解耗时选择每个case的进程数
+auto_process_num = False
+cells_per_process = 200
+rank_history_file = "files/rank_history.jsonl"
+rank_history_tolerance = 0.25
+rank_history_min_samples = 2
+rank_history = []
+rank_history_lock = threading.Lock()
+
+# 核数预算，多个case在总核数范围内并发求解
+free_cores = 0
+core_condition = threading.Condition()
+
+# 随测试结果一并上报的case附加信息
+case_report_keys = ["template", "seed", "process_num", "cells", "process_num_reason", "mode", "scaling_type",
+                    "baseline_time", "candidate_time", "speedup", "p_value", "validation_error", "mesh_cache", "wells", "perforations",
+                    "abort_reason", "cpu_user_time", "cpu_system_time", "peak_rss", "max_process_rss", "max_process_rss_upper_bound", "read_bytes", "write_bytes",
+                    "timesteps", "timestep_cuts", "newton_iterations", "linear_iterations", "newton_per_step", "linear_per_newton", "time_per_step",
+                    "result_cache", "sampling", "design_values"]
+
+# 求解监控配置：求解总时长上限、无输出时长上限（秒，为None时不限制），连续时间步缩减次数上限（为0时不限制）
+# 输出中出现发散特征（如NaN残差）或时间步连续缩减过多时判定为发散，超过时长上限时判定为超时，均终止整个MPI进程组
+solver_timeout = None
+stall_timeout = None
+max_timestep_cuts = 20
+divergence_patterns = [re.compile(r"(?i)(^|[^a-z])-?nan([^a-z]|$)")]
+timestep_cut_pattern = re.compile(r"(?i)(time ?step|dt).*(cut|chop|reduc)")
+timestep_pattern = re.compile(r"(?i)time ?step")
+watchdog_interval = 0.5
+
+# 求解日志中收敛信息的格式：时间步行（不含时间步缩减）记为完成一个时间步，牛顿迭代和线性迭代次数取第一个分组
+newton_pattern = re.compile(r"(?i)newton iterations?\s*[:=]\s*(\d+)")
+linear_pattern = re.compile(r"(?i)linear iterations?\s*[:=]\s*(\d+)")
+kill_grace_time = 5
+
+# 收到SIGINT/SIGTERM后停止测试：不再启动新的求解，终止正在运行的求解进程组，各流水线阶段处理完剩余case后退出
+# 求解进程位于单独的进程组中，收不到终端的Ctrl-C，需要按登记的进程组逐个终止
+shutdown_event = threading.Event()
+active_process_groups = set()
+active_process_group_lock = threading.Lock()
+
+# 求解器路径，以及包装求解器的命令（如性能分析工具），插入在mpirun参数和求解器之间
+solver_path = "./oil_solver"
+solver_wrapper = []
+
+# 求解结果缓存：相同配置、网格、求解器、进程数和环境变量的求解直接复用已有的结果、用时和结果文件，默认关闭
+# 只缓存完全由输入决定的结果（成功、失败、发散），超时与机器负载有关，中断和出错与本次运行有关，均不写入缓存
+result_cache = False
+result_cache_results = ["pass", "fail", "diverged"]
+result_cache_path = "result_cache"
+result_cache_env = ["OMP_NUM_THREADS"]
+result_cache_keys = ["result", "abort_reason", "execution_time", "cpu_user_time", "cpu_system_time", "peak_rss", "max_process_rss", "max_process_rss_upper_bound",
+                     "read_bytes", "write_bytes", "timesteps", "timestep_cuts", "newton_iterations", "linear_iterations",
+                     "newton_per_step", "linear_per_newton", "time_per_step"]
+solver_hashes = {}
+solver_hash_lock = threading.Lock()
+
+# 测试种子，每个case的种子由测试种子和case编号确定
+campaign_seed = 0
+
+# 测试参数的采样策略：random, lhs, halton, sobol, corners
+sampling_strategy = "random"
+
+# 复现的case：(模板文件名, case种子) -> 原测试中记录的case.json
+replay_cases = {}
+
+# 模板编译后的采样计划，按模板路径缓存
+template_plans = {}
+template_plan_lock = threading.Lock()
+
+# 扩展性测试配置：测试的进程数序列、强/弱扩展以及每个进程数的重复求解次数
+scaling_ranks = [1, 2, 4, 8, 16, 32, 64]
+scaling_type = "strong"
+scaling_repeat = 1
+
+# A/B对比测试配置：基准和待测求解器、每个case的重复求解次数、显著性水平以及判定性能变化的加速比阈值
+baseline_solver_path = "./oil_solver"
+candidate_solver_path = "./oil_solver"
+ab_repeat = 5
+ab_alpha = 0.05
+ab_threshold = 0.02
+
+# 网格文件是否输出为二进制（Fortran无格式记录）的Plot3D格式，默认输出文本格式
+mesh_binary = False
+
+# 压力测试配置：网格规格（为None时不生成压力测试case）、井的数量以及每口井射孔数量的上限
+stress_grid = None
+stress_well_num = 200
+stress_perforation_max = 10
+
+# 网格缓存：网格文件按网格步长的哈希命名存放在mesh文件夹中，相同网格的case共用网格文件
+# 缓存超过上限时按最近使用时间淘汰未被case使用的网格
+mesh_cache_path = "mesh"
+mesh_cache_size = 10 * 1024 ** 3
+mesh_cache_refs = {}
+mesh_cache_locks = {}
+mesh_cache_lock = threading.Lock()
+
+# 求解前是否校验生成的配置，校验不通过的case记为 generator error，不再求解
+validate_generated_cases = True
+
+# 失败边界搜索配置：是否对失败case搜索失败边界、每个失败case的最大探测求解次数以及浮点参数二分的终止精度（占取值范围的比例）
+boundary_search = False
+boundary_budget = 30
+boundary_tolerance = 1 / 64
+# 只对求解本身失败的case搜索失败边界，中断和出错的case不是求解失败
+boundary_search_results = ["fail", "diverged", "timeout"]
+
+# 结果打包配置：打包线程数、压缩格式（store, deflate, bzip2, lzma为zip包，zstd为tar.zst包）、压缩级别（为None时使用默认级别）
+# 以及打包时保留的文件（文件名通配符），其余文件在打包前删除
+package_workers = 2
+package_format = "deflate"
+package_level = None
+package_extensions = {"store": ".zip", "deflate": ".zip", "bzip2": ".zip", "lzma": ".zip", "zstd": ".tar.zst"}
+zip_compressions = {"store": zipfile.ZIP_STORED, "deflate": zipfile.ZIP_DEFLATED, "bzip2": zipfile.ZIP_BZIP2, "lzma": zipfile.ZIP_LZMA}
+keep_file_patterns = ["property.json", "case.json", "output.log", "template.json", "scaling.json", "boundary.json", "*.vts"]
+
+# 流水线各阶段之间的队列长度
+pipeline_queue_size = 2
+
+# 单次批量上报的最大case数
+report_batch_size = 32
+
+# 请求server的用时，在下一次批量上报时一并发送，由server计入监控指标
+pending_request_times = []
+request_times_lock = threading.Lock()
+
+# 多线程更新测试统计数据时使用
+test_data_lock = threading.Lock()
+
 # 设置环境变量
 os.environ["GTEST_CATCH_EXCEPTIONS"] = "0"
 os.environ["OMP_NUM_THREADS"] = "1"
@@ -104,19 +261,24 @@ default_injection_well_config = {
 
 # 初始化测试环境
 # url 为 ip + port
-def init_environment(url, template_file_path):
+# test_name 为测试汇总中的条目名称，默认为模板文件名加"测试"
+def init_environment(url, template_file_path, test_name=None):
 
     global test_details_file,test_summary_file_path,current_time
     template_file_name = template_file_path.split("/")[-1]
+    if test_name is None:
+        test_name = f"{template_file_name}测试"
 
     # 确认server在线，运行状态正常
+    start_time = time.time()
     response = requests.get(url + f"/is_alive/{template_file_name}")
+    record_request_time("is_alive", start_time)
     #logger.info(response.text)
     if response.status_code == 200:
         json_obj = json.loads(response.text)
         test_summary_file_path = json_obj["test_summary_file_path"]
         test_details_file = json_obj["test_details_file"]
-        logger.info(f"test summary file path: {test_summary_file_path}, test details file: {test_details_file}")
+        logger.info(f"test summary file path: {test_summary_file_path}, test details file: {test_details_file}, test data db file: {json_obj.get('test_data_db_file')}")
     else:
         logger.warning(f"something wrong with server, please check it")
         return False
@@ -132,289 +294,825 @@ def init_environment(url, template_file_path):
     logger.info(f"this test result storage create success, path {os.path.abspath(current_time)}")
 
     # 在测试汇总页面创建一个条目
-    response = requests.get(f"{url}/append_test_summary?name={template_file_name}测试&time={current_time}&link=/test_detail/{current_time}")
+    start_time = time.time()
+    response = requests.get(f"{url}/append_test_summary?name={test_name}&time={current_time}&link=/test_detail/{current_time}&seed={campaign_seed}&sampling={sampling_strategy}")
+    record_request_time("append_test_summary", start_time)
     #logger.info(response.text)
     if response.status_code == 200:
-        logger.info(f"test summary add success, new test summary name: {template_file_name}测试")
+        logger.info(f"test summary add success, new test summary name: {test_name}")
     else:
-        logger.warning(f"test summary {template_file_name}测试 add failed, please check it")
+        logger.warning(f"test summary {test_name} add failed, please check it")
         return False
     
     return True
 
-def analyze_json_array(json_array, need_test_keys):
-    if isinstance(json_array, list):
-        for item in json_array:
-            if isinstance(item, list):
-                analyze_json_array(item, need_test_keys)
-            elif isinstance(item, dict):
-                analyze_json(item, need_test_keys)
-
-
 # 随机生成在指定范围内的日期
-def random_date(start, end):
+def random_date(start, end, rng):
     delta = end - start
-    random_days = random.randint(0, delta.days)
+    random_days = rng.randint(0, delta.days)
     random_generated_date = start + timedelta(days=random_days)
     random_date_string = random_generated_date.strftime("%Y-%m-%d")
     return random_date_string
 
 
-def analyze_json(json_object, need_test_keys):
-    for key, value in json_object.items():
-        
-        # sgt 气液相渗表-气体饱和度主导特殊处理
-        if key == "SGT" and "test_item" in value:
-            json_object[key]["Values"].append([0, 0, 1, 0])
-            
-            # 拍脑袋想的，行数理论上可以更多
-            sgt_table_row_count = random.randint(2, 20)
-            sg_temp = 0
-            krg_temp = 0
-            krog_temp = 1
-            pcog_temp = 0
-
-            # 相渗表拍脑袋给个最大行数20行
-            # 极小概率取到下界，小了不能再小
-            for i in range(2, random.randint(3, 20)):
-                sg_temp = random.uniform(sg_temp, 1)
-                krg_temp = random.uniform(krg_temp, 1)
-                krog_temp = random.uniform(0, krog_temp)
-                pcog_temp = random.uniform(pcog_temp, 1)
-                json_object[key]["Values"].append([sg_temp, krg_temp, krog_temp, pcog_temp])
+# sgt 气液相渗表-气体饱和度主导特殊处理
+def sample_sgt_table(sgt, rng):
+    sgt["Values"].append([0, 0, 1, 0])
+    
+    # 拍脑袋想的，行数理论上可以更多
+    sgt_table_row_count = rng.randint(2, 20)
+    sg_temp = 0
+    krg_temp = 0
+    krog_temp = 1
+    pcog_temp = 0
+
+    # 相渗表拍脑袋给个最大行数20行
+    # 极小概率取到下界，小了不能再小
+    for i in range(2, rng.randint(3, 20)):
+        sg_temp = rng.uniform(sg_temp, 1)
+        krg_temp = rng.uniform(krg_temp, 1)
+        krog_temp = rng.uniform(0, krog_temp)
+        pcog_temp = rng.uniform(pcog_temp, 1)
+        sgt["Values"].append([sg_temp, krg_temp, krog_temp, pcog_temp])
+
+
+# 井相关配置特殊处理，在空的井列表中随机增加井
+# 默认配置只做浅拷贝，后续会被修改的列表字段重新创建
+# well_num 为None时随机确定井的数量，place_perforations 不为None时由其确定各井的射孔位置
+def sample_wells(wells, rng, well_num=None, place_perforations=None):
+    # 用防止井位置重复
+    well_position_set = set()
+
+    # 随机增加井的数量，先给个拍脑袋的数量1-10口吧
+    if well_num is None:
+        well_num = rng.randint(1,5)
+    for i in range(0, well_num):
+        well_object = {}
+        well_type = rng.randint(1,2)
+        if well_type == 1:
+            well_object = dict(default_injection_well_config, Events=[], Perforations=[])
+        elif well_type == 2:
+            well_object = dict(default_production_well_config, Events=[], Perforations=[])
+        # 井名由井类型和序号组成，不再使用当前时间，保证可复现
+        well_object["Name"] = f"{well_object['Name']}-{i}"
+        wells.append(well_object)
+
+    for well_index, well_item in enumerate(wells):
+        if "test_item" in well_item:
+            # 随机变更井事件的数量
+            event_num = rng.randint(1,10)
+            for i in range(0, event_num):
+                random_num = rng.randint(1, 2)
+                if random_num == 1:
+                    well_item["Events"].append(dict(default_injection_well_event_config))
+                elif random_num == 2:
+                    well_item["Events"].append(dict(default_production_well_event_config))
+    
+            for event in well_item["Events"]:
+                # 注入井的注入溶剂的摩尔含量和注入的流体相关
+                mol_size = 6
+                #mol_size = len(event["MOLEFRAC"])
+                molefrac = []
+                for i in range(0, mol_size):
+                    molefrac.append(0)
+
+                # 目前先不变更井的类型
+                if event["InjectedFluid"] == "solvent" or event["InjectedFluid"] == "water":
+                    random_num = rng.randint(1, 1)
+
+                    if random_num == 0:
+                        event["InjectedFluid"] = "water"
+
+                    elif random_num == 1:
+                        event["InjectedFluid"] = "solvent"
+
+                        #设置各组分的摩尔含量
+                        molefrac.clear()
+                        upper_limit = 1
+                        total_val = 0
+
+                        for i in range(0, mol_size-1):
+                            temp_value = rng.uniform(0, upper_limit)
+                            total_val = total_val + temp_value
+                            upper_limit = upper_limit - temp_value
+                            molefrac.append(temp_value)
+                        molefrac.append(1-total_val)
+                event["MOLEFRAC"] = molefrac
+
+                # 控制条件
+                event["Constraints"] = []
+                temp_obj = {}
+                temp_obj["Action"] = "continue"
+                if event["InjectedFluid"] != "solvent" and event["InjectedFluid"] != "water":
+                # 对于生产井来说
+                    # 目前只支持单生产控制条件
+                    random_num = rng.randint(1, 3)
+                    if random_num == 1:    
+                        temp_obj["Limit"] = "MIN"
+                        temp_obj["Parameter"] = "BHP"
+                        temp_obj["Value"] = rng.randint(5000, 15000)
+
+                    elif random_num == 2:
+                        temp_obj["Limit"] = "MAX"
+                        temp_obj["Parameter"] = "STO"
+                        temp_obj["Value"] = rng.uniform(0, 10000)
+
+                    elif random_num == 3:
+                        temp_obj["Limit"] = "MAX"
+                        temp_obj["Parameter"] = "STL"
+                        temp_obj["Value"] = rng.uniform(0, 10000)
+                else:
+                # 对于注入井来说
+                    random_num = rng.randint(1, 2)
+                    if random_num == 1:
+                        temp_obj["Limit"] = "MAX"
+                        temp_obj["Parameter"] = "BHP"
+                        # 井底压力拍脑袋给一个
+                        temp_obj["Value"] = rng.randint(15000, 50000)
+
+                    elif random_num == 2:
+                        temp_obj["Limit"] = "MAX"
+                        temp_obj["Parameter"] = "STG"
+                        # 井底压力拍脑袋给一个
+                        temp_obj["Value"] = rng.uniform(100.0, 2000.0)
+
+                event["Constraints"].append(temp_obj)
+
+                # 随机生成一个井事件的时间
+                event["Date"] = random_date(datetime.strptime("2000-01-01", "%Y-%m-%d"), datetime.strptime("2100-01-01", "%Y-%m-%d"), rng)
+
+                # 变更井的状态, 井关闭状态事件就跳过了，没有实际的处理意义
+                random_num = rng.randint(1, 1)
+                if random_num ==1:
+                    event["Status"] = "open"
+                elif random_num ==2:
+                    event["Status"] = "close"
+
+            # 井事件的时间各自随机生成，按时间先后排序，日期格式为YYYY-MM-DD可直接按字符串排序
+            well_item["Events"].sort(key=lambda event: event["Date"])
+
+        # 几何因子，井分数，表皮因子暂时未生效，略过
+        # 针对射孔来说，由于现阶段网格规格和井的修改无法联动，涉孔的数量就只能是一个或两个
+        # 现在射孔只有射孔位置一个参数生效
+        # 井状态这个参数目前无意义
+        if place_perforations is not None:
+            well_item["Perforations"] = [dict(default_perforation_config, BlockIdx=block_index) for block_index in place_perforations(well_index, well_position_set, rng)]
             continue
-        
 
-        # 井相关配置特殊处理
-        if key == "Wells" and isinstance(value, list) and not value:
-            # 用防止井位置重复
-            well_position_set = set()
-
-            # 随机增加井的数量，先给个拍脑袋的数量1-10口吧
-            well_num = random.randint(1,5)
-            for i in range(0, well_num):
-                well_object = {}
-                well_type = random.randint(1,2)
-                if well_type == 1:
-                    well_object = copy.deepcopy(default_injection_well_config)
-                elif well_type == 2:
-                    well_object = copy.deepcopy(default_production_well_config)
-                well_object["Name"] = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
-                value.append(well_object)
-
-            for well_item in value:
-                if "test_item" in well_item:
-                    # 随机变更井事件的数量
-                    event_num = random.randint(1,10)
-                    for i in range(0, event_num):
-                        random_num = random.randint(1, 2)
-                        if random_num == 1:
-                            well_item["Events"].append(copy.deepcopy(default_injection_well_event_config))
-                        elif random_num == 2:
-                            well_item["Events"].append(copy.deepcopy(default_production_well_event_config))
-            
-                    for event in well_item["Events"]:
-                        # 注入井的注入溶剂的摩尔含量和注入的流体相关
-                        mol_size = 6
-                        #mol_size = len(event["MOLEFRAC"])
-                        molefrac = []
-                        for i in range(0, mol_size):
-                            molefrac.append(0)
-
-                        # 目前先不变更井的类型
-                        if event["InjectedFluid"] == "solvent" or event["InjectedFluid"] == "water":
-                            random_num = random.randint(1, 1)
-
-                            if random_num == 0:
-                                event["InjectedFluid"] = "water"
-
-                            elif random_num == 1:
-                                event["InjectedFluid"] = "solvent"
-
-                                #设置各组分的摩尔含量
-                                molefrac.clear()
-                                upper_limit = 1
-                                total_val = 0
-
-                                for i in range(0, mol_size-1):
-                                    temp_value = random.uniform(0, upper_limit)
-                                    total_val = total_val + temp_value
-                                    upper_limit = upper_limit - temp_value
-                                    molefrac.append(temp_value)
-                                molefrac.append(1-total_val)
-                        event["MOLEFRAC"] = molefrac
-
-                        # 控制条件
-                        event["Constraints"] = []
-                        temp_obj = {}
-                        temp_obj["Action"] = "continue"
-                        if event["InjectedFluid"] != "solvent" and event["InjectedFluid"] != "water":
-                        # 对于生产井来说
-                            # 目前只支持单生产控制条件
-                            random_num = random.randint(1, 3)
-                            if random_num == 1:    
-                                temp_obj["Limit"] = "MIN"
-                                temp_obj["Parameter"] = "BHP"
-                                temp_obj["Value"] = random.randint(5000, 15000)
-
-                            elif random_num == 2:
-                                temp_obj["Limit"] = "MAX"
-                                temp_obj["Parameter"] = "STO"
-                                temp_obj["Value"] = random.uniform(0, 10000)
-
-                            elif random_num == 3:
-                                temp_obj["Limit"] = "MAX"
-                                temp_obj["Parameter"] = "STL"
-                                temp_obj["Value"] = random.uniform(0, 10000)
-                        else:
-                        # 对于注入井来说
-                            random_num = random.randint(1, 2)
-                            if random_num == 1:
-                                temp_obj["Limit"] = "MAX"
-                                temp_obj["Parameter"] = "BHP"
-                                # 井底压力拍脑袋给一个
-                                temp_obj["Value"] = random.randint(15000, 50000)
-
-                            elif random_num == 2:
-                                temp_obj["Limit"] = "MAX"
-                                temp_obj["Parameter"] = "STG"
-                                # 井底压力拍脑袋给一个
-                                temp_obj["Value"] = random.uniform(100.0, 2000.0)
-
-                        event["Constraints"].append(temp_obj)
-
-                        # 随机生成一个井事件的时间
-                        event["Date"] = random_date(datetime.strptime("2000-01-01", "%Y-%m-%d"), datetime.strptime("2100-01-01", "%Y-%m-%d"))
-
-                        # 变更井的状态, 井关闭状态事件就跳过了，没有实际的处理意义
-                        random_num = random.randint(1, 1)
-                        if random_num ==1:
-                            event["Status"] = "open"
-                        elif random_num ==2:
-                            event["Status"] = "close"
-
-                # 几何因子，井分数，表皮因子暂时未生效，略过
-                # 针对射孔来说，由于现阶段网格规格和井的修改无法联动，涉孔的数量就只能是一个或两个
-                # 现在射孔只有射孔位置一个参数生效
-                # 井状态这个参数目前无意义
-                perforations_num = random.randint(1, 2)
-                well_item["Perforations"] = []
-                obj = copy.deepcopy(default_perforation_config)
-
-                x_position = random.randint(1, 20)
-                y_position = random.randint(1, 20)
-                while True:
-                    if (x_position, y_position) in well_position_set:
-                        x_position = random.randint(1, 20)
-                        y_position = random.randint(1, 20)
-                    else:
-                        well_position_set.add((x_position ,y_position))
-                        break
-
-                if perforations_num == 1:
-                    z_position = random.randint(1, 2)
-                    obj["BlockIdx"] = [x_position, y_position, z_position]
-                    well_item["Perforations"].append(obj)
-                elif perforations_num == 2:
-                    obj["BlockIdx"] = [x_position, y_position, 1]
-
-                    obj_temp = copy.deepcopy(obj)
-                    obj["BlockIdx"] = [x_position, y_position, 2]
-
-                    well_item["Perforations"].append(obj)
-                    well_item["Perforations"].append(obj_temp)
-
-
-        if key == "Reservoir" and isinstance(value, dict) and "test_item" in value:
+        perforations_num = rng.randint(1, 2)
+        well_item["Perforations"] = []
+        obj = dict(default_perforation_config)
 
-            value_range_nx = value["Grid"]["NX"]["value_range"]
-            value_range_ny = value["Grid"]["NY"]["value_range"]
-            value_range_nz = value["Grid"]["NZ"]["value_range"]
-
-            value["Grid"]["NX"] = random.randint(value["Grid"]["NX"]["value_range"][0], value["Grid"]["NX"]["value_range"][1])
-            value["Grid"]["NY"] = random.randint(value["Grid"]["NY"]["value_range"][0], value["Grid"]["NY"]["value_range"][1])
-            value["Grid"]["NZ"] = random.randint(value["Grid"]["NZ"]["value_range"][0], value["Grid"]["NZ"]["value_range"][1])
+        x_position = rng.randint(1, 20)
+        y_position = rng.randint(1, 20)
+        while True:
+            if (x_position, y_position) in well_position_set:
+                x_position = rng.randint(1, 20)
+                y_position = rng.randint(1, 20)
+            else:
+                well_position_set.add((x_position ,y_position))
+                break
+
+        if perforations_num == 1:
+            z_position = rng.randint(1, 2)
+            obj["BlockIdx"] = [x_position, y_position, z_position]
+            well_item["Perforations"].append(obj)
+        elif perforations_num == 2:
+            obj["BlockIdx"] = [x_position, y_position, 1]
+
+            obj_temp = dict(obj)
+            obj["BlockIdx"] = [x_position, y_position, 2]
+
+            well_item["Perforations"].append(obj)
+            well_item["Perforations"].append(obj_temp)
+
+
+# 油藏网格规格特殊处理
+# sizes 中给定的网格数直接使用，随机数仍按随机取得的网格数照常抽取，保证其余参数的取值与随机采样时一致
+# 给定网格数小于随机取值时网格步长取随机步长的前段，大于时循环使用随机步长
+def sample_reservoir_grid(reservoir, rng, sizes=None):
+    value_range_nx = reservoir["Grid"]["NX"]["value_range"]
+    value_range_ny = reservoir["Grid"]["NY"]["value_range"]
+    value_range_nz = reservoir["Grid"]["NZ"]["value_range"]
+
+    reservoir["Grid"]["NX"] = rng.randint(reservoir["Grid"]["NX"]["value_range"][0], reservoir["Grid"]["NX"]["value_range"][1])
+    reservoir["Grid"]["NY"] = rng.randint(reservoir["Grid"]["NY"]["value_range"][0], reservoir["Grid"]["NY"]["value_range"][1])
+    reservoir["Grid"]["NZ"] = rng.randint(reservoir["Grid"]["NZ"]["value_range"][0], reservoir["Grid"]["NZ"]["value_range"][1])
+
+    # 网格实际尺寸也是拍脑袋想的
+    i_var = []
+    for i in range(0, reservoir["Grid"]["NX"]):
+        i_var.append(rng.uniform(1, 100))
+    reservoir["Grid"]["IVAR"] = i_var
+
+    j_var = []
+    for i in range(0, reservoir["Grid"]["NY"]):
+        j_var.append(rng.uniform(1, 100))
+    reservoir["Grid"]["JVAR"] = j_var
+
+    k_var = []
+    for i in range(0, reservoir["Grid"]["NZ"]):
+        k_var.append(rng.uniform(1, 100))
+    reservoir["Grid"]["KVAR"] = k_var
+
+    if sizes is not None:
+        for key, var_key in [("NX", "IVAR"), ("NY", "JVAR"), ("NZ", "KVAR")]:
+            if key in sizes:
+                var = reservoir["Grid"][var_key]
+                reservoir["Grid"][var_key] = [var[i % len(var)] for i in range(sizes[key])]
+                reservoir["Grid"][key] = sizes[key]
+
+    # 岩石压缩系数和参考压力未处理
+
+
+# 在指定范围内随机取值，整数范围取整数
+def sample_value_range(value_range, rng):
+    min_value = value_range[0]
+    max_value = value_range[1]
+
+    if isinstance(min_value, int):
+        return rng.randint(min_value, max_value)
+    return rng.uniform(min_value, max_value)
+
+
+# 对动态生成的配置（如新增的井）中需要测试的参数取值
+def sample_value_ranges(json_object, need_test_keys, rng):
+    items = json_object.items() if isinstance(json_object, dict) else enumerate(json_object)
+    for key, value in items:
+        if isinstance(value, dict) and "test_item" in value and "value_range" in value:
+            json_object[key] = sample_value_range(value["value_range"], rng)
+            need_test_keys.append(key)
+        elif isinstance(value, (dict, list)):
+            sample_value_ranges(value, need_test_keys, rng)
 
-            # 网格实际尺寸也是拍脑袋想的
-            i_var = []
-            for i in range(0, value["Grid"]["NX"]):
-                i_var.append(random.uniform(1, 100))
-            value["Grid"]["IVAR"] = i_var
 
-            j_var = []
-            for i in range(0, value["Grid"]["NY"]):
-                j_var.append(random.uniform(1, 100))
-            value["Grid"]["JVAR"] = j_var
+# 编译模板：遍历一次模板，按遍历顺序记录需要测试的节点路径及其采样方式，得到可重复使用的采样计划
+# 每个case只需解析一次模板文本并依次执行采样步骤，不再重复读取和遍历模板
+def compile_template(template_file_path):
+    with open(template_file_path, 'r') as f:
+        object_js = json.load(f)
 
-            k_var = []
-            for i in range(0, value["Grid"]["NZ"]):
-                k_var.append(random.uniform(1, 100))
-            value["Grid"]["KVAR"] = k_var
+    plan = {"template_file_path": template_file_path, "template_text": json.dumps(object_js), "steps": []}
+    if not compile_json(object_js, [], plan["steps"]):
+        return None
+
+    # 模板中取值范围固定的测试参数作为采样空间的维度，动态生成的参数（如新增井的RW）不在其中
+    plan["dimensions"] = []
+    names = set()
+    for step in plan["steps"]:
+        if step["kind"] == "value_range":
+            step["name"] = step["path"][-1]
+            index = 2
+            while step["name"] in names:
+                step["name"] = f"{step['path'][-1]}#{index}"
+                index = index + 1
+            names.add(step["name"])
+            plan["dimensions"].append({"name": step["name"], "value_range": step["value_range"]})
+        elif step["kind"] == "reservoir":
+            for key, value_range in step["value_ranges"].items():
+                plan["dimensions"].append({"name": key, "value_range": value_range})
+                names.add(key)
+    return plan
+
+
+def compile_json(json_object, path, steps):
+    items = json_object.items() if isinstance(json_object, dict) else enumerate(json_object)
+    for key, value in items:
+        if key == "SGT" and isinstance(value, dict) and "test_item" in value:
+            steps.append({"kind": "sgt", "path": path + [key]})
+            continue
 
-            # 岩石压缩系数和参考压力未处理
+        # 新增的井在实例化时生成，井中需要测试的参数随井一起取值
+        if key == "Wells" and isinstance(value, list) and not value:
+            steps.append({"kind": "wells", "path": path + [key]})
 
+        # 网格规格取值后NX/NY/NZ不再是需要测试的节点
+        if key == "Reservoir" and isinstance(value, dict) and "test_item" in value:
+            steps.append({"kind": "reservoir", "path": path + [key],
+                          "value_ranges": {grid_key: value["Grid"][grid_key]["value_range"] for grid_key in ["NX", "NY", "NZ"]}})
+            value["Grid"]["NX"] = 0
+            value["Grid"]["NY"] = 0
+            value["Grid"]["NZ"] = 0
 
         if isinstance(value, dict) and "test_item" in value and "value_range" in value:
             value_range = value["value_range"]
             if len(value_range) != 2:
                 logger.warning(f"template file format error, value range error, error key:{key}")
                 return False
-            
-            min_value = value_range[0]
-            max_value = value_range[1]
+            steps.append({"kind": "value_range", "path": path + [key], "value_range": value_range})
 
-            if isinstance(min_value, int):
-                random_num = random.randint(min_value, max_value)
-            else:
-                random_num = random.uniform(min_value, max_value)
-            json_object[key] = random_num
+        elif isinstance(value, (dict, list)):
+            if not compile_json(value, path + [key], steps):
+                return False
+
+    return True
+
+
+# 按采样计划生成一个case的配置，返回配置、取值的测试参数名和各维度的实际取值
+# values 中给定的测试参数（按维度名称）直接使用给定值，其余参数随机取值
+def instantiate_plan(plan, rng, values=None):
+    if values is None:
+        values = {}
+    object_js = json.loads(plan["template_text"])
+    need_test_keys = []
+    case_values = {}
+    for step in plan["steps"]:
+        parent = object_js
+        for key in step["path"][:-1]:
+            parent = parent[key]
+        key = step["path"][-1]
+
+        if step["kind"] == "sgt":
+            sample_sgt_table(parent[key], rng)
+        elif step["kind"] == "wells":
+            sample_wells(parent[key], rng)
+            sample_value_ranges(parent[key], need_test_keys, rng)
+        elif step["kind"] == "reservoir":
+            sample_reservoir_grid(parent[key], rng, values)
+            for grid_key in step["value_ranges"]:
+                case_values[grid_key] = parent[key]["Grid"][grid_key]
+        elif step["kind"] == "value_range":
+            parent[key] = sample_value_range(step["value_range"], rng)
+            if step["name"] in values:
+                parent[key] = values[step["name"]]
             need_test_keys.append(key)
+            case_values[step["name"]] = parent[key]
+    return object_js, need_test_keys, case_values
 
-        elif isinstance(value, dict):
-            analyze_json(value, need_test_keys)
 
-        elif isinstance(value, list):
-            analyze_json_array(value, need_test_keys)
+# 获取模板的采样计划，每个模板只编译一次
+def get_template_plan(template_file_path):
+    with template_plan_lock:
+        if template_file_path not in template_plans:
+            start_time = time.time()
+            template_plans[template_file_path] = compile_template(template_file_path)
+            logger.info(f"template {template_file_path} compiled in {time.time() - start_time}s")
+        return template_plans[template_file_path]
 
+
+# 将[0,1]内的位置映射为取值范围内的值，整数范围按等宽区间取整
+def design_value(value_range, position):
+    min_value = value_range[0]
+    max_value = value_range[1]
+    if isinstance(min_value, int):
+        return min(max_value, min_value + int(position * (max_value - min_value + 1)))
+    return min_value + position * (max_value - min_value)
+
+
+# 第index个Halton序列值（以base为底的倒序数）
+def radical_inverse(index, base):
+    result = 0
+    fraction = 1 / base
+    while index > 0:
+        result = result + fraction * (index % base)
+        index = index // base
+        fraction = fraction / base
+    return result
+
+
+def first_primes(count):
+    primes = []
+    number = 2
+    while len(primes) < count:
+        if all(number % prime != 0 for prime in primes):
+            primes.append(number)
+        number = number + 1
+    return primes
+
+
+# 空间填充采样：给出case_num个case在各个维度上的位置（[0,1]内），由测试种子确定
+# lhs: 拉丁超立方，每个维度的case_num个等分区间各有一个case
+# halton: 随机平移的Halton低差异序列
+# sobol: 打乱的Sobol序列，需要安装scipy
+# corners: 按打乱后的顺序依次取采样空间的各个角点，最后取中心点，case数多于角点数时循环
+def design_points(strategy, dimension_num, case_num, seed):
+    rng = random.Random(f"{seed}-{strategy}")
+    if strategy == "lhs":
+        columns = []
+        for d in range(dimension_num):
+            strata = list(range(case_num))
+            rng.shuffle(strata)
+            columns.append([(strata[i] + rng.random()) / case_num for i in range(case_num)])
+        return [[columns[d][i] for d in range(dimension_num)] for i in range(case_num)]
+
+    if strategy == "halton":
+        primes = first_primes(dimension_num)
+        shifts = [rng.random() for d in range(dimension_num)]
+        return [[(radical_inverse(i + 1, primes[d]) + shifts[d]) % 1.0 for d in range(dimension_num)] for i in range(case_num)]
+
+    if strategy == "sobol":
+        if dimension_num == 0:
+            return [[] for i in range(case_num)]
+        sampler = qmc.Sobol(d=dimension_num, scramble=True, seed=rng.getrandbits(32))
+        return sampler.random(case_num).tolist()
+
+    if strategy == "corners":
+        corners = [list(corner) for corner in itertools.product([0.0, 1.0], repeat=dimension_num)]
+        rng.shuffle(corners)
+        corners.append([0.5] * dimension_num)
+        return [corners[i % len(corners)] for i in range(case_num)]
+
+    raise ValueError(f"unknown sampling strategy {strategy}")
+
+
+# 按采样策略给出每个case的测试参数取值，随机采样时返回None
+def design_values(plan, strategy, case_num, seed):
+    if strategy == "random":
+        return None
+    dimensions = plan["dimensions"]
+    points = design_points(strategy, len(dimensions), case_num, seed)
+    return [{dimension["name"]: design_value(dimension["value_range"], point[d]) for d, dimension in enumerate(dimensions)}
+            for point in points]
+
+
+# 获取配置文件中的工程对象，与mesh_generator一致取最后一个工程
+def get_project(object_js):
+    project = None
+    for key, value in object_js.items():
+        project = value
+    return project
+
+
+# 将mpi进程数分解为三个方向上的进程划分，尽量减少子区域之间的交界面
+def process_grid_size(num, grid_size):
+    nx, ny, nz = grid_size
+    best_cost = None
+    best_grid = None
+    for px in range(1, num + 1):
+        if num % px != 0:
+            continue
+        for py in range(1, num // px + 1):
+            if (num // px) % py != 0:
+                continue
+            pz = num // px // py
+            if px > nx or py > ny or pz > nz:
+                continue
+            cost = (px - 1) * ny * nz + (py - 1) * nx * nz + (pz - 1) * nx * ny
+            if best_cost is None or cost < best_cost:
+                best_cost = cost
+                best_grid = [px, py, pz]
+    return best_grid
+
+
+# 读取历史求解记录，用于自动选择进程数，历史文件每行为一条JSON记录
+def load_rank_history():
+    global rank_history
+    records = []
+    if os.path.isfile(rank_history_file):
+        with open(rank_history_file, 'r', encoding='utf-8') as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    with rank_history_lock:
+        rank_history = records
+
+
+# 记录一次成功求解的网格数、进程数和耗时，并追加到历史文件末尾，不改写已有的记录
+def append_rank_history(case):
+    record = {"template": case["template"], "cells": case["cells"],
+              "process_num": case["process_num"], "time": case["execution_time"]}
+    with rank_history_lock:
+        rank_history.append(record)
+        with open(rank_history_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+# 根据网格数和历史求解耗时选择进程数
+# 候选进程数为按单进程网格数估计的进程数及其一半和两倍，
+# 候选中历史样本不足的优先选择以积累数据，样本充足时选择按网格数折算后耗时中位数最小的进程数
+def select_process_num(template_file_name, grid_size):
+    cells = grid_size[0] * grid_size[1] * grid_size[2]
+    candidates = []
+    estimate = 1
+    while estimate * 2 <= process_num and cells / (estimate * 2) >= cells_per_process:
+        estimate = estimate * 2
+    for num in [estimate // 2, estimate, estimate * 2]:
+        if 1 <= num <= process_num and num not in candidates and process_grid_size(num, grid_size) is not None:
+            candidates.append(num)
+
+    with rank_history_lock:
+        similar_records = [record for record in rank_history
+                           if record["template"] == template_file_name
+                           and abs(record["cells"] - cells) <= cells * rank_history_tolerance]
+
+    best_num = None
+    best_time = None
+    for num in candidates:
+        times = sorted(record["time"] * cells / record["cells"] for record in similar_records if record["process_num"] == num)
+        if len(times) < rank_history_min_samples:
+            return num, "explore"
+        median_time = times[len(times) // 2]
+        if best_time is None or median_time < best_time:
+            best_num = num
+            best_time = median_time
+    return best_num, "history"
+
+
+# 获取工程中的油藏网格配置及网格规格
+def get_grid(project):
+    return project["field"]["fluid"]["TwoPhaseOilGasMultiComp"]["Reservoir"]["Grid"]
+
+
+def get_grid_size(project):
+    grid = get_grid(project)
+    return [len(grid["IVAR"]), len(grid["JVAR"]), len(grid["KVAR"])]
+
+
+# 设置工程的进程数和进程划分
+def set_process_layout(project, num):
+    grid_size = get_grid_size(project)
+    process_grid = process_grid_size(num, grid_size)
+    if process_grid is None:
+        logger.warning(f"can not split {grid_size} grid into {num} processes")
+        return False
+    project["solver"]["process_num"] = num
+    project["mesh"]["processGridSize"] = [process_grid]
     return True
-    
 
-# 随机变更配置文件参数
-def random_change_parameters(template_file_path, case_id):
 
-    global current_time
+# 设置单个case的进程数、进程划分以及网格文件名，case中已指定进程数时直接使用
+# 网格文件名为网格步长的内容哈希，即网格缓存的键，相同网格的case共用网格文件
+def set_case_layout(object_js, case):
+    project = get_project(object_js)
+    grid_size = get_grid_size(project)
+    case["cells"] = grid_size[0] * grid_size[1] * grid_size[2]
+
+    if "process_num" in case:
+        case.setdefault("process_num_reason", "fixed")
+    elif auto_process_num:
+        case["process_num"], case["process_num_reason"] = select_process_num(case["template"], grid_size)
+    else:
+        case["process_num"], case["process_num_reason"] = process_num, "fixed"
+    logger.info(f"test case {case['case_id']} cells: {case['cells']}, process num: {case['process_num']} ({case['process_num_reason']})")
+
+    if not set_process_layout(project, case["process_num"]):
+        return False
+
+    set_mesh_file(project)
+    return True
+
+
+# 获取case的存储路径，默认为 <current_time>/<case_id>
+def get_case_storage_path(case):
+    return os.path.abspath(case.get("storage_path", f"{current_time}/" + str(case["case_id"])))
 
-    current_case_storage_path = f"{current_time}/" + str(case_id)
-    logger.info(f"current case storage path: {os.path.abspath(current_case_storage_path)}")
+
+# 创建case的存储目录
+def create_case_storage(case):
+    current_case_storage_path = get_case_storage_path(case)
+    logger.info(f"current case storage path: {current_case_storage_path}")
 
     if os.path.exists(current_case_storage_path):
         logger.warning(f"this test case storage already exits, path: {current_case_storage_path}, please check it")
         return False
 
     os.makedirs(current_case_storage_path)
+    return True
 
-    with open(template_file_path, 'r') as f:
-        object_js = json.load(f)
 
-    # 遍历json，找出需要测试的key,并将需要测试的key赋予实际的值
-    need_test_keys = []
-    if analyze_json(object_js, need_test_keys):
-        logger.info(f"need test keys: {need_test_keys}")
-    else:
+# 设置case的进程划分和网格文件名后，将配置输出到case对应的文件夹中
+def write_case_property(object_js, case):
+    if not set_case_layout(object_js, case):
         return False
-    
-    # 将变更后的json文件输出到当次测试的对应文件夹中
+
+    current_case_storage_path = get_case_storage_path(case)
     with open(f"{current_case_storage_path}/property.json", 'w', encoding='utf-8') as f:
         json.dump(object_js, f, ensure_ascii=False, indent=4)
     logger.info(f"property.json output success, output path {current_case_storage_path}/property.json")
+    return True
+
+
+# 由测试种子和case编号确定case的种子，与case的生成顺序无关
+def derive_case_seed(case_id):
+    return random.Random(f"{campaign_seed}-{case_id}").getrandbits(32)
 
+
+# 进程划分后第index个进程在某一方向上的网格范围（从1开始，包含两端）
+def partition_range(size, parts, index):
+    return index * size // parts + 1, (index + 1) * size // parts
+
+
+# 生成压力测试case：将配置中的网格替换为stress_grid规格，网格步长随机取值（保留模板中步长的方向）
+# 并重新生成stress_well_num口井，井按顺序轮流分配到各个进程，射孔位置位于所分配进程的网格范围内
+def apply_stress_case(object_js, case, rng):
+    project = get_project(object_js)
+    grid = get_grid(project)
+    for key, var_key, size in zip(["NX", "NY", "NZ"], ["IVAR", "JVAR", "KVAR"], stress_grid):
+        sign = -1 if grid[var_key] and grid[var_key][0] < 0 else 1
+        grid[var_key] = [sign * rng.uniform(1, 100) for i in range(size)]
+        grid[key] = size
+
+    if "process_num" not in case:
+        if auto_process_num:
+            case["process_num"], case["process_num_reason"] = select_process_num(case["template"], stress_grid)
+        else:
+            case["process_num"] = process_num
+    partitions = process_grid_size(case["process_num"], stress_grid)
+    if partitions is None:
+        logger.warning(f"stress grid {stress_grid} can not be split into {case['process_num']} processes")
+        return False
+
+    def place_perforations(well_index, well_position_set, rng):
+        partition = well_index % (partitions[0] * partitions[1] * partitions[2])
+        partition_index = [partition % partitions[0], partition // partitions[0] % partitions[1], partition // (partitions[0] * partitions[1])]
+        x_range, y_range, z_range = [partition_range(size, parts, index) for size, parts, index in zip(stress_grid, partitions, partition_index)]
+        for i in range(1000):
+            x_position = rng.randint(*x_range)
+            y_position = rng.randint(*y_range)
+            if (x_position, y_position) not in well_position_set:
+                well_position_set.add((x_position, y_position))
+                break
+        else:
+            raise ValueError(f"no free well position in partition {partition_index}, too many wells")
+        z_position = rng.randint(*z_range)
+        perforations_num = rng.randint(1, min(stress_perforation_max, z_range[1] - z_position + 1))
+        return [[x_position, y_position, z] for z in range(z_position, z_position + perforations_num)]
+
+    wells_list = find_json_values(object_js, "Wells")
+    if not wells_list:
+        logger.warning(f"no wells in template, stress case only has the enlarged grid")
+        return True
+    wells = wells_list[0]
+    wells.clear()
+    sample_wells(wells, rng, stress_well_num, place_perforations)
+    case["wells"] = len(wells)
+    case["perforations"] = sum(len(well_item["Perforations"]) for well_item in wells)
+    logger.info(f"stress case {case['case_id']} grid {stress_grid}, wells {case['wells']}, perforations {case['perforations']}, partitions {partitions}")
     return True
 
 
+# 随机变更配置文件参数，配置完全由 (模板, case种子, 采样策略给出的测试参数取值) 确定，随机采样时没有后者
+def random_change_parameters(template_file_path, case):
+
+    if not create_case_storage(case):
+        return False
+
+    plan = get_template_plan(template_file_path)
+    if plan is None:
+        return False
+
+    # 按模板的采样计划给需要测试的key赋予实际的值
+    if "seed" not in case:
+        case["seed"] = derive_case_seed(case["case_id"])
+    logger.info(f"test case {case['case_id']} seed: {case['seed']}")
+    object_js, need_test_keys, case["values"] = instantiate_plan(plan, random.Random(case["seed"]), case.get("design_values"))
+    logger.info(f"need test keys: {need_test_keys}")
+
+    # 压力测试的网格和井使用单独的随机数序列，不影响其余参数的取值
+    if stress_grid is not None and not apply_stress_case(object_js, case, random.Random(f"{case['seed']}-stress")):
+        return False
+
+    # 将变更后的json文件输出到当次测试的对应文件夹中
+    if not write_case_property(object_js, case):
+        return False
+
+    # 记录复现case所需的信息：非随机采样策略下测试参数的取值由整个测试的采样决定，不能只由种子确定
+    with open(f"{get_case_storage_path(case)}/case.json", 'w', encoding='utf-8') as f:
+        json.dump({"template": case["template"], "seed": case["seed"], "sampling": case.get("sampling", "random"),
+                   "design_values": case.get("design_values")}, f, ensure_ascii=False, indent=4)
+    return True
+
+
+# 直接使用已生成的配置文件作为case，不再随机变更参数
+def copy_case_property(property_file_path, case):
+
+    if not create_case_storage(case):
+        return False
+
+    with open(property_file_path, 'r') as f:
+        object_js = json.load(f)
+
+    return write_case_property(object_js, case)
+
+
+# 查找配置中所有指定key的值
+def find_json_values(json_object, target_key, found=None):
+    if found is None:
+        found = []
+    items = json_object.items() if isinstance(json_object, dict) else enumerate(json_object)
+    for key, value in items:
+        if key == target_key:
+            found.append(value)
+        elif isinstance(value, (dict, list)):
+            find_json_values(value, target_key, found)
+    return found
+
+
+# 校验生成的配置，返回错误信息列表，列表为空表示校验通过
+# 校验项：网格规格与步长（步长的正负表示方向）、射孔位置是否在网格内、相渗表单调性、注入流体摩尔含量之和以及井事件的时间顺序
+def validate_property(object_js):
+    errors = []
+    project = get_project(object_js)
+
+    # 网格规格与步长
+    grid = get_grid(project)
+    grid_size = get_grid_size(project)
+    for key, var_key in zip(["NX", "NY", "NZ"], ["IVAR", "JVAR", "KVAR"]):
+        if grid[key] < 1:
+            errors.append(f"grid {key} {grid[key]} less than 1")
+        if len(grid[var_key]) != grid[key]:
+            errors.append(f"grid {var_key} length {len(grid[var_key])} not equal to {key} {grid[key]}")
+        if any(value == 0 for value in grid[var_key]):
+            errors.append(f"grid {var_key} has zero spacing")
+
+    for well in find_json_values(object_js, "Wells"):
+        for well_item in well:
+            # 射孔位置
+            for perforation in well_item.get("Perforations", []):
+                block_index = perforation["BlockIdx"]
+                if any(index < 1 or index > size for index, size in zip(block_index, grid_size)):
+                    errors.append(f"well {well_item.get('Name')} perforation {block_index} out of grid {list(grid_size)}")
+
+            # 井事件的时间顺序
+            dates = [datetime.strptime(event["Date"], "%Y-%m-%d") for event in well_item.get("Events", []) if "Date" in event]
+            for i in range(1, len(dates)):
+                if dates[i] < dates[i - 1]:
+                    errors.append(f"well {well_item.get('Name')} event date {dates[i].strftime('%Y-%m-%d')} before {dates[i - 1].strftime('%Y-%m-%d')}")
+                    break
+
+            # 注入流体各组分的摩尔含量非负且之和为1
+            for event in well_item.get("Events", []):
+                molefrac = event.get("MOLEFRAC")
+                if not molefrac or event.get("InjectedFluid") != "solvent":
+                    continue
+                if any(value < 0 for value in molefrac) or abs(sum(molefrac) - 1) > 1e-6:
+                    errors.append(f"well {well_item.get('Name')} MOLEFRAC {molefrac} not a valid composition")
+                    break
+
+    # 气液相渗表：气体饱和度递增，气相相渗和毛管力不减，油相相渗不增，取值均在 [0, 1] 内
+    for sgt in find_json_values(object_js, "SGT"):
+        rows = sgt["Values"] if isinstance(sgt, dict) else []
+        for i, row in enumerate(rows):
+            if any(value < 0 or value > 1 for value in row):
+                errors.append(f"SGT row {i} {row} out of [0, 1]")
+            if i == 0:
+                continue
+            last_row = rows[i - 1]
+            if row[0] <= last_row[0] or row[1] < last_row[1] or row[2] > last_row[2] or row[3] < last_row[3]:
+                errors.append(f"SGT row {i} {row} not monotone after {last_row}")
+    return errors
+
+
+# 校验阶段：校验不通过的case直接记为 generator error，跳过网格生成和求解，错误信息写入求解日志
+def validate_case(case):
+    if not validate_generated_cases:
+        return case
+
+    current_case_storage_path = get_case_storage_path(case)
+    with open(f"{current_case_storage_path}/property.json", 'r') as f:
+        errors = validate_property(json.load(f))
+    if not errors:
+        return case
+
+    logger.warning(f"test case {case['case_id']} validation failed: {errors}")
+    with open(f"{current_case_storage_path}/output.log", 'w', encoding='utf-8') as f:
+        f.write("\n".join(errors) + "\n")
+    case["result"] = "generator error"
+    case["validation_error"] = "; ".join(errors)
+    case["execution_time"] = 0
+    case["result_file"] = get_result_file_name(case)
+    return case
+
+
+# 记录case某个阶段的用时，end_time为None时以当前时间为结束时间
+def record_stage_time(case, stage_name, start_time, end_time=None):
+    if end_time is None:
+        end_time = time.time()
+    case.setdefault("stage_times", {})[stage_name] = end_time - start_time
+
+
+# case结果包的文件名，扩展名由打包格式决定
+def get_result_file_name(case):
+    return str(case["case_id"]) + package_extensions[package_format]
+
+
+# 判断文件是否在打包时保留
+def is_kept_file(file_name):
+    return any(fnmatch.fnmatch(file_name, pattern) for pattern in keep_file_patterns)
+
+
+# 按打包格式压缩文件夹
+def compress_directory(source_dir, output_file):
+    if package_format == "zstd":
+        compress_directory_to_tar_zst(source_dir, output_file)
+    else:
+        compress_directory_to_zip(source_dir, output_file, zip_compressions[package_format], package_level)
+
+
+# 压缩文件夹成tar.zst包，level为None时使用zstd的默认级别
+def compress_directory_to_tar_zst(source_dir, output_file):
+    compressor = zstandard.ZstdCompressor(level=package_level if package_level is not None else 3, threads=-1)
+    with open(output_file, 'wb') as f:
+        with compressor.stream_writer(f) as writer:
+            with tarfile.open(fileobj=writer, mode='w|') as tar:
+                for root, dirs, files in os.walk(source_dir):
+                    for file in files:
+                        file_path = os.path.join(root, file)
+                        tar.add(file_path, arcname=os.path.relpath(file_path, source_dir))
+
+
 # 压缩文件夹成zip包
-def compress_directory_to_zip(source_dir, output_file):
+def compress_directory_to_zip(source_dir, output_file, compression=zipfile.ZIP_DEFLATED, compresslevel=None):
     # 创建一个 zip 文件
-    with zipfile.ZipFile(output_file, 'w', zipfile.ZIP_DEFLATED) as zipf:
+    with zipfile.ZipFile(output_file, 'w', compression, compresslevel=compresslevel) as zipf:
         # 遍历文件夹中的所有文件和子文件夹
         for root, dirs, files in os.walk(source_dir):
             for file in files:
@@ -424,79 +1122,458 @@ def compress_directory_to_zip(source_dir, output_file):
                 zipf.write(file_path, arcname=os.path.relpath(file_path, source_dir))
 
 
-# 进行单次求解（即运行单次测试）
-def run_solver(case_id, template_file_path, test_data_object):
-    global current_time
+# 在单独的线程中等待求解进程结束，记录结束时间和资源使用情况
+# wait4返回的资源使用包括mpirun回收的各个子进程
+def wait_solver(solver_run):
+    pid, status, rusage = os.wait4(solver_run["process"].pid, 0)
+    solver_run["end_time"] = time.time()
+    solver_run["rusage"] = rusage
+    solver_run["process"].returncode = os.waitstatus_to_exitcode(status)
+    solver_run["finished"].set()
 
-    current_case_storage_path = f"{current_time}/" + str(case_id)
-    current_case_storage_path = os.path.abspath(current_case_storage_path)
-    command = ["mpirun", "-n", "64", "./oil_solver", f"{current_case_storage_path}/property.json", "1"]
 
-    
-    # 启动子进程，捕获输出并等待其完成
-    start_time = time.time()
-    result = 0
-    logger.info(f"executed command {command}")
+# 终止求解进程所在的整个进程组，先发送SIGTERM，超过等待时间后发送SIGKILL
+def kill_process_group(solver_run):
+    pgid = solver_run["process"].pid
     try:
-        with open(f"{current_case_storage_path}/output.log", 'w', encoding='utf-8') as outfile:
-            subprocess.run(command, check=True, stdout=outfile, stderr=outfile, text=True)
+        os.killpg(pgid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    if not solver_run["finished"].wait(kill_grace_time):
+        try:
+            os.killpg(pgid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        solver_run["finished"].wait()
+
+
+# 向所有正在运行的求解进程组发送信号
+def kill_active_process_groups(signum):
+    with active_process_group_lock:
+        pgids = list(active_process_groups)
+    for pgid in pgids:
+        try:
+            os.killpg(pgid, signum)
+        except ProcessLookupError:
+            pass
+
+
+# SIGINT/SIGTERM的处理：第一次收到时停止测试并终止求解进程组，再次收到时强制终止求解并立即退出
+def handle_shutdown_signal(signum, frame):
+    if shutdown_event.is_set():
+        logger.warning(f"signal {signum} received again, exit immediately")
+        kill_active_process_groups(signal.SIGKILL)
+        os._exit(1)
+    logger.warning(f"signal {signum} received, stopping the test")
+    shutdown_event.set()
+    kill_active_process_groups(signal.SIGTERM)
+
+
+# 采样求解进程组中各进程的峰值内存（/proc/<pid>/status 中的VmHWM），按进程记录最大值，用于统计各rank峰值内存之和
+# 只能采样到本机上的进程，没有procfs时不采样
+def sample_process_group_memory(pgid, peak_rss):
+    if not os.path.isdir("/proc"):
+        return
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat", 'r') as f:
+                if int(f.read().rsplit(")", 1)[1].split()[2]) != pgid:
+                    continue
+            with open(f"/proc/{name}/status", 'r') as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        peak_rss[name] = max(peak_rss.get(name, 0), int(line.split()[1]) * 1024)
+        except (OSError, ValueError, IndexError):
+            continue
 
-        end_time = time.time()
-        execution_time = end_time - start_time
 
-        zip_file_path = str(case_id) + ".zip"
+# 记录求解的资源使用：用户态和内核态CPU时间、各进程峰值内存之和、单个进程的最大峰值内存以及块设备读写量
+# 峰值内存只取自VmHWM采样，没有采样到进程内存时（如求解时间短于采样间隔）记为None
+# wait4返回的ru_maxrss包含fork时继承的测试工具自身的内存，只作为单个进程峰值内存的上限记录
+def record_resource_usage(case, solver_run):
+    rusage = solver_run["rusage"]
+    case["cpu_user_time"] = rusage.ru_utime
+    case["cpu_system_time"] = rusage.ru_stime
+    case["peak_rss"] = sum(solver_run["peak_rss"].values()) if solver_run["peak_rss"] else None
+    case["max_process_rss"] = max(solver_run["peak_rss"].values()) if solver_run["peak_rss"] else None
+    case["max_process_rss_upper_bound"] = rusage.ru_maxrss * 1024
+    case["read_bytes"] = rusage.ru_inblock * 512
+    case["write_bytes"] = rusage.ru_oublock * 512
+
+
+# 检查一行求解输出，返回发散原因，未发散时返回None；watch_state中记录连续的时间步缩减次数
+def check_solver_output(line, watch_state):
+    for pattern in divergence_patterns:
+        if pattern.search(line):
+            return f"divergence pattern in output: {line.strip()}"
+    if timestep_cut_pattern.search(line):
+        watch_state["timestep_cuts"] = watch_state["timestep_cuts"] + 1
+        if max_timestep_cuts and watch_state["timestep_cuts"] >= max_timestep_cuts:
+            return f"{watch_state['timestep_cuts']} consecutive timestep cuts"
+    elif timestep_pattern.search(line):
+        watch_state["timestep_cuts"] = 0
+    return None
+
+
+# 从一行求解输出中提取收敛信息，累计到convergence中
+def parse_convergence_line(line, convergence):
+    if timestep_cut_pattern.search(line):
+        convergence["timestep_cuts"] = convergence["timestep_cuts"] + 1
+    elif timestep_pattern.search(line):
+        convergence["timesteps"] = convergence["timesteps"] + 1
+    match = newton_pattern.search(line)
+    if match:
+        convergence["newton_iterations"] = convergence["newton_iterations"] + int(match.group(1))
+    match = linear_pattern.search(line)
+    if match:
+        convergence["linear_iterations"] = convergence["linear_iterations"] + int(match.group(1))
+
+
+# 记录求解的收敛指标：时间步数、时间步缩减次数、牛顿和线性迭代总数，以及每步牛顿迭代数、每次牛顿迭代的线性迭代数和每步用时
+def record_convergence(case, convergence):
+    case.update(convergence)
+    case["newton_per_step"] = convergence["newton_iterations"] / convergence["timesteps"] if convergence["timesteps"] else None
+    case["linear_per_newton"] = convergence["linear_iterations"] / convergence["newton_iterations"] if convergence["newton_iterations"] else None
+    case["time_per_step"] = case["execution_time"] / convergence["timesteps"] if convergence["timesteps"] else None
+
+
+# 监控求解进程：跟踪求解日志，发散、超过总时长或长时间无输出时终止整个进程组
+# 日志的每一行同时提取收敛信息，记录在solver_run["convergence"]中
+# 返回 (测试结果, 终止原因)，正常结束时返回None；非正常退出的求解在日志中有发散特征时同样记为发散
+def watch_solver(solver_run, log_file_path, start_time):
+    process = solver_run["process"]
+    watch_state = {"timestep_cuts": 0}
+    last_output_time = start_time
+    partial_line = ""
+    with open(log_file_path, 'r', encoding='utf-8', errors='replace') as log_file:
+        while True:
+            finished = solver_run["finished"].wait(watchdog_interval)
+            if not finished:
+                sample_process_group_memory(process.pid, solver_run["peak_rss"])
+
+            abort = None
+            text = log_file.read()
+            if text:
+                last_output_time = time.time()
+            # 求解结束时，最后一行即使没有换行符也要解析
+            if text or (finished and partial_line):
+                lines = (partial_line + text).split("\n")
+                partial_line = "" if finished else lines.pop()
+                for line in lines:
+                    parse_convergence_line(line, solver_run["convergence"])
+                    if abort is None:
+                        reason = check_solver_output(line, watch_state)
+                        if reason is not None:
+                            abort = ("diverged", reason)
+
+            if finished:
+                if shutdown_event.is_set() and process.returncode != 0:
+                    return ("interrupted", "test interrupted by signal")
+                return abort if abort is not None and process.returncode != 0 else None
+            if abort is None and shutdown_event.is_set():
+                abort = ("interrupted", "test interrupted by signal")
+            if abort is None and solver_timeout and time.time() - start_time > solver_timeout:
+                abort = ("timeout", f"wall clock limit {solver_timeout}s exceeded")
+            if abort is None and stall_timeout and time.time() - last_output_time > stall_timeout:
+                abort = ("timeout", f"no output for {stall_timeout}s")
+            if abort is not None:
+                kill_process_group(solver_run)
+                return abort
+
+
+# 计算文件内容的sha256
+def get_file_hash(file_path):
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+# 计算求解器可执行文件的hash，按路径、修改时间和大小缓存，找不到求解器时返回None
+def get_solver_hash(solver):
+    solver_file_path = shutil.which(solver) or solver
+    try:
+        stat = os.stat(solver_file_path)
+    except OSError:
+        return None
+    key = (os.path.realpath(solver_file_path), stat.st_mtime_ns, stat.st_size)
+    with solver_hash_lock:
+        if key not in solver_hashes:
+            solver_hashes[key] = get_file_hash(solver_file_path)
+        return solver_hashes[key]
+
+
+# 计算case求解结果的缓存键：配置文件内容、网格、求解器、包装命令、进程数和环境变量，求解器不存在时返回None
+# 网格名即网格的内容地址，配置文件中已包含网格名，这里单独列出便于排查
+def get_result_cache_key(case):
+    current_case_storage_path = get_case_storage_path(case)
+    solver_hash = get_solver_hash(case.get("solver", solver_path))
+    if solver_hash is None:
+        return None
+    with open(f"{current_case_storage_path}/property.json", 'r') as f:
+        mesh_name = get_project(json.load(f))["mesh"]["file"]["gridfile"]
+    key = json.dumps({"property": get_file_hash(f"{current_case_storage_path}/property.json"), "mesh": mesh_name,
+                      "solver": solver_hash, "wrapper": solver_wrapper, "process_num": case["process_num"],
+                      "env": {name: os.environ.get(name) for name in result_cache_env}}, sort_keys=True)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+# 判断求解生成的文件是否作为结果文件保留，即打包时保留的文件中除求解输入以外的文件
+def is_result_artifact(file_name):
+    return is_kept_file(file_name) and file_name != "property.json" and file_name != "case.json" and file_name != "template.json"
+
+
+# 从结果缓存中恢复case的求解结果和结果文件，未命中时返回False
+def load_cached_result(case, key):
+    entry_path = f"{result_cache_path}/{key}"
+    if not os.path.isfile(f"{entry_path}/result.json"):
+        return False
+    current_case_storage_path = get_case_storage_path(case)
+    with open(f"{entry_path}/result.json", 'r') as f:
+        cached_result = json.load(f)
+    # 旧版本写入的中断、出错等结果不复用，删除后重新求解并写入
+    if cached_result.get("result") not in result_cache_results:
+        shutil.rmtree(entry_path, ignore_errors=True)
+        return False
+    for file_name in os.listdir(entry_path):
+        if file_name != "result.json":
+            shutil.copy(f"{entry_path}/{file_name}", f"{current_case_storage_path}/{file_name}")
+    os.utime(f"{entry_path}/result.json")
+    case.update(cached_result)
+    return True
 
-        # 上传测试结果
-        logger.info(f"test case {case_id} executed success!")
-        response = requests.get(url + f"/append_test_details?test_id={current_time}&case_name={case_id}&result=pass&time={execution_time}s&result_file={zip_file_path}")
-        #logger.info(response.text)
-        if response.status_code == 200:
-            logger.info(f"write result to test details success")
-        else:
-            logger.warning(f"write result to test details fail")
 
-        test_data_object["success_times"] = test_data_object["success_times"] + 1 
-        test_data_object["all_test_duration"] = test_data_object["all_test_duration"] + execution_time
-        test_data_object["success_duration"] = test_data_object["success_duration"] + execution_time
+# 将case的求解结果和结果文件写入结果缓存，先写到临时文件夹再整体移动，避免其他case读到未写完的缓存
+def store_cached_result(case, key):
+    entry_path = f"{result_cache_path}/{key}"
+    if os.path.isdir(entry_path):
+        return
+    current_case_storage_path = get_case_storage_path(case)
+    temp_path = f"{result_cache_path}/tmp-{key}-{os.getpid()}-{threading.get_ident()}"
+    os.makedirs(temp_path, exist_ok=True)
+    try:
+        for file_name in os.listdir(current_case_storage_path):
+            if is_result_artifact(file_name) and os.path.isfile(f"{current_case_storage_path}/{file_name}"):
+                shutil.copy(f"{current_case_storage_path}/{file_name}", f"{temp_path}/{file_name}")
+        with open(f"{temp_path}/result.json", 'w', encoding='utf-8') as f:
+            json.dump({name: case[name] for name in result_cache_keys if name in case}, f, ensure_ascii=False, indent=4)
+        os.rename(temp_path, entry_path)
+    except OSError as e:
+        logger.warning(f"store result cache of test case {case['case_id']} failed, error: {e}")
+    finally:
+        shutil.rmtree(temp_path, ignore_errors=True)
+
+
+# 进行单次求解（即运行单次测试），只负责启动求解器，结果记录在case对象中
+# use_cache为False时总是实际求解，用于扩展性测试、A/B测试等以求解用时为测量对象的场景
+def run_solver(case, use_cache=True):
+    global current_time
 
-    except subprocess.CalledProcessError as e:
+    case_id = case["case_id"]
+    current_case_storage_path = get_case_storage_path(case)
+    cache_key = get_result_cache_key(case) if result_cache and use_cache else None
+    if cache_key is not None:
+        start_time = time.time()
+        if load_cached_result(case, cache_key):
+            case["result_cache"] = "hit"
+            case["result_file"] = get_result_file_name(case)
+            record_stage_time(case, "solve", start_time)
+            logger.info(f"test case {case_id} result cache hit {cache_key}, result {case['result']}")
+            return case
+        case["result_cache"] = "miss"
+
+    # 测试停止后不再启动新的求解
+    if shutdown_event.is_set():
+        case["result"] = "interrupted"
+        case["abort_reason"] = "test interrupted by signal"
+        case["execution_time"] = 0
+        case["result_file"] = get_result_file_name(case)
+        return case
+    command = ["mpirun", "-n", str(case["process_num"])] + solver_wrapper + [case.get("solver", solver_path), f"{current_case_storage_path}/property.json", "1"]
+
+    # 启动子进程，捕获输出并在监控下等待其完成，子进程位于单独的进程组中以便整体终止
+    start_time = time.time()
+    logger.info(f"executed command {command}")
+    with open(f"{current_case_storage_path}/output.log", 'w', encoding='utf-8') as outfile:
+        process = subprocess.Popen(command, stdout=outfile, stderr=outfile, text=True, start_new_session=True)
+    with active_process_group_lock:
+        active_process_groups.add(process.pid)
+    solver_run = {"process": process, "finished": threading.Event(), "peak_rss": {},
+                  "convergence": {"timesteps": 0, "timestep_cuts": 0, "newton_iterations": 0, "linear_iterations": 0}}
+    threading.Thread(target=wait_solver, args=(solver_run,), daemon=True).start()
+    try:
+        abort = watch_solver(solver_run, f"{current_case_storage_path}/output.log", start_time)
+    except BaseException:
+        kill_process_group(solver_run)
+        raise
+    finally:
+        with active_process_group_lock:
+            active_process_groups.discard(process.pid)
+
+    if abort is not None:
+        case["result"], case["abort_reason"] = abort
+        logger.warning(f"test case {case_id} aborted, {case['result']}: {case['abort_reason']}")
+    elif process.returncode == 0:
+        case["result"] = "pass"
+        logger.info(f"test case {case_id} executed success!")
+    else:
+        case["result"] = "fail"
+        logger.warning(f"test case {case_id} executed fail!")
 
-        end_time = time.time()
-        execution_time = end_time - start_time
+    end_time = solver_run["end_time"]
+    case["execution_time"] = end_time - start_time
+    record_stage_time(case, "solve", start_time, end_time)
+    record_resource_usage(case, solver_run)
+    record_convergence(case, solver_run["convergence"])
+    logger.info(f"test case {case_id} timesteps {case['timesteps']}, timestep cuts {case['timestep_cuts']}, newton iterations {case['newton_iterations']}, linear iterations {case['linear_iterations']}")
+    logger.info(f"test case {case_id} cpu time {case['cpu_user_time']:.3f}s user, {case['cpu_system_time']:.3f}s system, peak rss {case['peak_rss']} bytes, read {case['read_bytes']} bytes, write {case['write_bytes']} bytes")
+    case["result_file"] = get_result_file_name(case)
+    if cache_key is not None and case["result"] in result_cache_results:
+        store_cached_result(case, cache_key)
+    return case
 
-        zip_file_path = str(case_id) + ".zip"
 
-        response = requests.get(url + f"/append_test_details?test_id={current_time}&case_name={case_id}&result=fail&time={execution_time}s&result_file={zip_file_path}")
-        logger.warning(f"test case {case_id} executed fail!")
-        if response.status_code == 200:
-            logger.info(f"write result to test details success")
-        else:
-            logger.warning(f"write result to test details fail")
+# 删除case文件夹中的无用文件，网格文件由网格缓存管理
+def clean_case_files(case):
+    current_case_storage_path = get_case_storage_path(case)
 
-        test_data_object["fail_times"] = test_data_object["fail_times"] + 1 
-        test_data_object["all_test_duration"] = test_data_object["all_test_duration"] + execution_time
-        test_data_object["fail_duration"] = test_data_object["fail_duration"] + execution_time
+    # 删除无用文件，扩展性测试等模式下各次求解位于case的子文件夹中
+    for root, dirs, files in os.walk(current_case_storage_path):
+        for file_name in files:
+            file_path = os.path.join(root, file_name)
 
-    # 将单次test_case的测试结果落地
-    response = requests.get(url + f"/store_test_details_data")
-    if response.status_code == 200:
-            logger.info(f"store test details data success")
-    else:
-        logger.warning(f"store test details data fail")
+            if not is_kept_file(file_name):
+                os.remove(file_path)
 
-    # 删除无用文件
-    for file_name in os.listdir(current_case_storage_path):
-        file_path = os.path.join(current_case_storage_path, file_name)
 
-        if os.path.isfile(file_path) and (file_name != "property.json" and file_name != "output.log" and file_name != "template.json" and not file_name.endswith(".vts")) :  # 只处理文件
-             os.remove(file_path)
+# 清理并压缩单个case的结果文件
+def package_case(case):
+    current_case_storage_path = get_case_storage_path(case)
+    start_time = time.time()
+    clean_case_files(case)
+    record_stage_time(case, "clean", start_time)
 
     # 将结果文件压缩
-    compress_directory_to_zip(current_case_storage_path, f"{current_time}/" + zip_file_path)
+    start_time = time.time()
+    compress_directory(current_case_storage_path, f"{current_time}/" + case["result_file"])
+    record_stage_time(case, "compress", start_time)
 
     # # 拷贝模板文件到当前文件夹
     # template_file_name = template_file_path.split("/")[-1]
     # shutil.copy(template_file_path, f"{current_case_storage_path}/{template_file_name}")
+    return case
+
+
+# 上报时随case结果一并发送的信息
+def get_case_report(case):
+    params = {"case_name": case["case_id"], "result": case["result"],
+              "time": f"{case['execution_time']}s", "result_file": case["result_file"]}
+    for key in case_report_keys:
+        if key in case:
+            params[key] = json.dumps(case[key], ensure_ascii=False) if isinstance(case[key], dict) else case[key]
+    for stage_name, stage_time in case.get("stage_times", {}).items():
+        params[f"stage_{stage_name}"] = stage_time
+    return params
+
+
+# 记录一次请求server的用时
+def record_request_time(request_name, start_time):
+    with request_times_lock:
+        pending_request_times.append({"request": request_name, "seconds": time.time() - start_time})
+
+
+# 批量上传case的测试结果和测试汇总（可选），server在一次操作中写入并落地
+# 之前请求server的用时随本批一并发送，本次请求的用时在下一批发送
+def post_test_details_batch(cases, summary=None):
+    batch = {"test_id": current_time, "cases": [get_case_report(case) for case in cases]}
+    if summary is not None:
+        batch["summary"] = summary
+    with request_times_lock:
+        request_times = list(pending_request_times)
+        pending_request_times.clear()
+    if request_times:
+        batch["request_times"] = request_times
+    start_time = time.time()
+    response = requests.post(url + "/append_test_details_batch", json=batch)
+    record_request_time("append_test_details_batch", start_time)
+    if response.status_code != 200:
+        logger.warning(f"write {len(cases)} results to test details fail, {response.text}")
+        # 上报失败时请求用时留待下一批发送
+        with request_times_lock:
+            pending_request_times[:0] = request_times
+        return False
+    if cases:
+        logger.info(f"write {len(cases)} results to test details success")
+    return True
+
+
+# 上传一批case的测试结果，并更新测试统计数据
+def report_cases(cases, test_data_object):
+    start_time = time.time()
+    post_test_details_batch(cases)
+
+    for case in cases:
+        result = case["result"]
+        execution_time = case["execution_time"]
+
+        # 扩展性测试和A/B测试的case以固定的进程数多次求解，缓存命中的用时不是本次实际求解的用时，均不计入进程数历史
+        if result == "pass" and case.get("mode") not in ["scaling", "ab"] and case.get("result_cache") != "hit":
+            append_rank_history(case)
+
+        # 配置校验不通过的case未求解，不计入成功率统计
+        with test_data_lock:
+            if result == "generator error":
+                test_data_object["invalid_times"] = test_data_object["invalid_times"] + 1
+            elif result == "pass" or result == "improved":
+                test_data_object["success_times"] = test_data_object["success_times"] + 1
+                test_data_object["success_duration"] = test_data_object["success_duration"] + execution_time
+            else:
+                test_data_object["fail_times"] = test_data_object["fail_times"] + 1
+                test_data_object["fail_duration"] = test_data_object["fail_duration"] + execution_time
+            test_data_object["all_test_duration"] = test_data_object["all_test_duration"] + execution_time
+
+    # 上报用时（主要为请求server的用时）计入测试的阶段用时统计，同一批的case记为相同的用时
+    # 请求用时由下一次批量上报发送给server
+    for case in cases:
+        record_stage_time(case, "report", start_time)
+        with test_data_lock:
+            for stage_name, stage_time in case["stage_times"].items():
+                stage_stats = test_data_object["stage_times"].setdefault(stage_name, {"total": 0, "count": 0, "max": 0})
+                stage_stats["total"] = stage_stats["total"] + stage_time
+                stage_stats["count"] = stage_stats["count"] + 1
+                stage_stats["max"] = max(stage_stats["max"], stage_time)
+        logger.info(f"test case {case['case_id']} finish")
+
+
+# 上传单个case的测试结果，并更新测试统计数据
+def report_case(case, test_data_object):
+    report_cases([case], test_data_object)
+
+
+# 上报阶段：上报期间到达的case合并为一批上报，每批最多report_batch_size个
+def report_cases_from_queue(stage, test_data_object, finished_cases):
+    while not stage["finished"]:
+        case = get_stage_case(stage)
+        if case is None:
+            break
+        cases = [case]
+        while len(cases) < report_batch_size:
+            try:
+                case = get_stage_case(stage, block=False)
+            except queue.Empty:
+                break
+            if case is None:
+                break
+            cases.append(case)
+        try:
+            report_cases(cases, test_data_object)
+        except Exception as e:
+            logger.error(f"report stage of test cases {[case['case_id'] for case in cases]} failed, error: {e}")
+            continue
+        finished_cases.extend(cases)
 
 def send_message_to_feishu():
 
@@ -525,34 +1602,290 @@ def send_message_to_feishu():
     logger.info("send message to feishu successfully.")
 
 
+# 清空server中的测试数据，同时确认server在线，运行状态正常
 def clean_up():
-    with open(f"./files/test_details.json", 'w', encoding='utf-8') as f:
-        object_js = {}
-        json.dump(object_js, f, ensure_ascii=False, indent=4)
-
-    with open(f"./files/test_summary.json", 'w', encoding='utf-8') as f:
-        object_js = {}
-        object_js["test_summary"] = {}
-        json.dump(object_js, f, ensure_ascii=False, indent=4)
-
-    # 确认server在线，运行状态正常
-    response = requests.get(url + f"/re_load_data")
+    start_time = time.time()
+    response = requests.get(url + f"/clean_up_data")
+    record_request_time("clean_up_data", start_time)
     #logger.info(response.text)
     if response.status_code == 200:
         logger.info(f"{response.text}")
     else:
-        logger.warning(f"re-load data failed")
+        logger.warning(f"clean up data failed")
         return False
     return True
 
-def run_auto_test(url, template_file_path, total_test_time):
+# 申请求解所需的核数，核数不足时等待其他case释放
+def acquire_cores(num):
+    global free_cores
+    with core_condition:
+        while free_cores < num:
+            core_condition.wait()
+        free_cores = free_cores - num
 
-    if init_environment(url, template_file_path):
-        logger.info(f"environment initial success")
-    else:
-        logger.error(f"environment initial failed")
-        return
 
+# 释放求解占用的核数
+def release_cores(num):
+    global free_cores
+    with core_condition:
+        free_cores = free_cores + num
+        core_condition.notify_all()
+
+
+# 在线程池中执行单个case的求解，结束后归还核数并交给打包阶段
+def run_case_solver(case, package_queue):
+    try:
+        case = run_solver(case)
+    except Exception as e:
+        record_case_error(case, "solve", e)
+    finally:
+        release_case_mesh(case)
+        release_cores(case["process_num"])
+    package_queue.put(case)
+
+
+# 打包阶段：在线程池中并发打包（压缩时释放GIL），打包完成的case交给上报阶段，上报顺序可能与求解顺序不同
+# 打包用时按clean和compress两个阶段分别记录，不再单独记录package阶段，避免各阶段总用时相加时重复计算
+def package_cases(stage):
+    def package_worker(case):
+        try:
+            case = package_case(case)
+        except Exception as e:
+            record_case_error(case, "package", e)
+        stage["output_queue"].put(case)
+
+    with ThreadPoolExecutor(max_workers=package_workers) as executor:
+        while True:
+            case = get_stage_case(stage)
+            if case is None:
+                break
+            executor.submit(package_worker, case)
+
+
+# 记录case在某个阶段出错，case不再进入后续阶段的处理，作为出错的case上报
+def record_case_error(case, stage_name, error):
+    logger.error(f"{stage_name} stage of test case {case['case_id']} failed, error: {error}")
+    case["result"] = "error"
+    case["abort_reason"] = f"{stage_name} stage failed: {error}"
+    case.setdefault("execution_time", 0)
+    case["result_file"] = get_result_file_name(case)
+
+
+# 创建流水线阶段，阶段之间通过有界队列衔接，队列中的None为结束标记
+def new_stage(stage_name, input_queue, output_queue):
+    return {"name": stage_name, "input_queue": input_queue, "output_queue": output_queue, "finished": input_queue is None, "error": None}
+
+
+# 从阶段的输入队列中取出一个case，取到结束标记时返回None；block为False且队列为空时抛出queue.Empty
+def get_stage_case(stage, block=True):
+    case = stage["input_queue"].get(block)
+    if case is None:
+        stage["finished"] = True
+    return case
+
+
+# 在线程中运行流水线阶段：阶段异常退出时记录错误，并取走输入队列中剩余的case直到结束标记，避免上游阻塞在已满的队列上
+# 无论阶段是否异常退出，最后都向下游传递结束标记
+def run_stage(stage, stage_func, *args):
+    try:
+        stage_func(stage, *args)
+    except Exception as e:
+        logger.exception(f"{stage['name']} stage failed, error: {e}")
+        stage["error"] = e
+        while not stage["finished"]:
+            case = get_stage_case(stage)
+            if case is not None:
+                release_case_mesh(case)
+    finally:
+        if stage["output_queue"] is not None:
+            stage["output_queue"].put(None)
+
+
+# 流水线阶段：从输入队列取case处理后放入输出队列，已有结果（如出错）的case直接交给下一阶段
+def run_pipeline_stage(stage, stage_func):
+    while True:
+        case = get_stage_case(stage)
+        if case is None:
+            break
+        if "result" not in case:
+            start_time = time.time()
+            try:
+                case = stage_func(case)
+            except Exception as e:
+                record_case_error(case, stage["name"], e)
+            record_stage_time(case, stage["name"], start_time)
+        if stage["output_queue"] is not None:
+            stage["output_queue"].put(case)
+
+
+# 生成阶段：依次生成各个case的配置文件，生成失败时停止后续case的生成
+# 指定seeds时按给定的种子生成case，用于复现
+# 非随机采样策略下先按case总数生成所有case的测试参数取值
+# 单个case生成出错时记为出错的case，继续生成后续case
+def generate_cases(stage, template_file_path, total_test_time, seeds=None):
+    case_design_values = None
+    plan = get_template_plan(template_file_path)
+    if seeds is None and plan is not None:
+        case_design_values = design_values(plan, sampling_strategy, int(total_test_time), campaign_seed)
+        logger.info(f"sampling strategy: {sampling_strategy}, dimensions: {[dimension['name'] for dimension in plan['dimensions']]}")
+
+    for i in range(0, int(total_test_time)):
+        if shutdown_event.is_set():
+            logger.warning(f"test stopped, no more test case generated")
+            break
+        logger.info(f"----------------------------------")
+        logger.info(f"")
+        logger.info(f"")
+        logger.info(f"test case {i} start")
+        case = {"case_id": i, "template": template_file_path.split("/")[-1], "sampling": sampling_strategy}
+        if seeds is not None:
+            case["seed"] = seeds[i]
+            # 复现时使用原测试中记录的采样策略和测试参数取值
+            replay_case = replay_cases.get((case["template"], seeds[i]))
+            if replay_case is not None:
+                case["sampling"] = replay_case["sampling"]
+                if replay_case["design_values"] is not None:
+                    case["design_values"] = replay_case["design_values"]
+            else:
+                logger.warning(f"case.json of seed {seeds[i]} not found, replayed with {sampling_strategy} sampling, use --replay-source to replay lhs/halton/sobol/corners cases")
+        if case_design_values is not None:
+            case["design_values"] = case_design_values[i]
+        start_time = time.time()
+        try:
+            success = random_change_parameters(template_file_path, case)
+        except Exception as e:
+            record_case_error(case, "generate", e)
+            stage["output_queue"].put(case)
+            continue
+        if success:
+            logger.info(f"random change parameter success")
+        else:
+            logger.error(f"random change parameter failed")
+            break
+        record_stage_time(case, "generate", start_time)
+        stage["output_queue"].put(case)
+
+
+# 网格缓存中的网格名：网格步长和网格文件格式的哈希，网格相同的case得到相同的网格名
+def get_mesh_name(project):
+    grid = get_grid(project)
+    key = json.dumps({"IVAR": grid["IVAR"], "JVAR": grid["JVAR"], "KVAR": grid["KVAR"], "dim": 3, "binary": mesh_binary})
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+# 将配置中的网格文件名设置为网格缓存中的网格名
+def set_mesh_file(project):
+    mesh_name = get_mesh_name(project)
+    project["mesh"]["file"]["gridfile"] = f"{mesh_name}.x"
+    project["mesh"]["file"]["inpfile"] = f"{mesh_name}.inp"
+
+
+# 获取配置对应的网格，缓存中没有时生成网格，返回网格名以及是否命中缓存
+# 网格先生成到临时文件夹中再移动到缓存中，避免其他case读到未写完的网格文件；使用中的网格不会被淘汰，用完后需调用release_mesh
+def acquire_mesh(property_file_path):
+    with open(property_file_path, 'r') as f:
+        mesh_name = get_project(json.load(f))["mesh"]["file"]["gridfile"].split(".")[0]
+
+    with mesh_cache_lock:
+        mesh_cache_refs[mesh_name] = mesh_cache_refs.get(mesh_name, 0) + 1
+        mesh_lock = mesh_cache_locks.setdefault(mesh_name, threading.Lock())
+
+    try:
+        with mesh_lock:
+            grid_file_path = f"{mesh_cache_path}/{mesh_name}.x"
+            inp_file_path = f"{mesh_cache_path}/{mesh_name}.inp"
+            hit = os.path.isfile(grid_file_path) and os.path.isfile(inp_file_path)
+            if hit:
+                os.utime(grid_file_path)
+            else:
+                temp_path = f"{mesh_cache_path}/tmp-{mesh_name}-{os.getpid()}-{threading.get_ident()}"
+                os.makedirs(temp_path, exist_ok=True)
+                try:
+                    mesh_generator.mesh_generator_interface(property_file_path, temp_path, logger, mesh_binary)
+                    os.replace(f"{temp_path}/{mesh_name}.inp", inp_file_path)
+                    os.replace(f"{temp_path}/{mesh_name}.x", grid_file_path)
+                finally:
+                    shutil.rmtree(temp_path, ignore_errors=True)
+    except Exception:
+        release_mesh(mesh_name)
+        raise
+
+    logger.info(f"mesh {mesh_name} {'cache hit' if hit else 'generated'}")
+    if not hit:
+        evict_meshes()
+    return mesh_name, hit
+
+
+# 归还网格的使用
+def release_mesh(mesh_name):
+    with mesh_cache_lock:
+        mesh_cache_refs[mesh_name] = mesh_cache_refs[mesh_name] - 1
+        if mesh_cache_refs[mesh_name] == 0:
+            del mesh_cache_refs[mesh_name]
+    evict_meshes()
+
+
+# 网格缓存超过上限时，按最近使用时间从早到晚删除未被使用的网格
+def evict_meshes():
+    with mesh_cache_lock:
+        meshes = {}
+        for entry in os.scandir(mesh_cache_path):
+            mesh_name, extension = os.path.splitext(entry.name)
+            if not entry.is_file() or extension not in [".x", ".inp"]:
+                continue
+            mesh = meshes.setdefault(mesh_name, {"size": 0, "time": 0})
+            mesh["size"] = mesh["size"] + entry.stat().st_size
+            if extension == ".x":
+                mesh["time"] = entry.stat().st_mtime
+
+        total_size = sum(mesh["size"] for mesh in meshes.values())
+        for mesh_name, mesh in sorted(meshes.items(), key=lambda item: item[1]["time"]):
+            if total_size <= mesh_cache_size:
+                break
+            if mesh_name in mesh_cache_refs or mesh_name in mesh_cache_locks and mesh_cache_locks[mesh_name].locked():
+                continue
+            for extension in [".x", ".inp"]:
+                if os.path.isfile(f"{mesh_cache_path}/{mesh_name}{extension}"):
+                    os.remove(f"{mesh_cache_path}/{mesh_name}{extension}")
+            total_size = total_size - mesh["size"]
+            logger.info(f"mesh {mesh_name} evicted from mesh cache")
+
+
+# 归还case使用的网格
+def release_case_mesh(case):
+    if "mesh" in case:
+        release_mesh(case.pop("mesh"))
+
+
+# 网格生成阶段，已有结果（配置校验不通过）的case跳过
+def generate_case_mesh(case):
+    if "result" in case:
+        return case
+    case["mesh"], hit = acquire_mesh(f"{get_case_storage_path(case)}/property.json")
+    case["mesh_cache"] = "hit" if hit else "miss"
+    logger.info(f"mesh generate finish")
+    return case
+
+
+# 求解阶段：在总核数预算内并发求解，所有case求解完成后通知打包阶段结束
+def solve_cases(stage):
+    max_workers = total_cores if auto_process_num else max(1, total_cores // process_num)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            case = get_stage_case(stage)
+            if case is None:
+                break
+            if "result" in case:
+                stage["output_queue"].put(case)
+                continue
+            start_time = time.time()
+            acquire_cores(case["process_num"])
+            record_stage_time(case, "wait_cores", start_time)
+            executor.submit(run_case_solver, case, stage["output_queue"])
+
+
+# 创建测试统计数据
+def new_test_data_object():
     test_data_object = {}
     # 成功次数
     test_data_object["success_times"] = 0
@@ -564,60 +1897,781 @@ def run_auto_test(url, template_file_path, total_test_time):
     test_data_object["success_duration"] = 0
     # 失败总时长
     test_data_object["fail_duration"] = 0
+    # 配置校验不通过的次数
+    test_data_object["invalid_times"] = 0
+    # 各阶段的用时统计：总用时、次数和最长用时
+    test_data_object["stage_times"] = {}
+    # 测试开始时间
+    test_data_object["start_time"] = time.time()
+    return test_data_object
+
+
+# 将测试的汇总结果更新到表格并落地
+def update_test_summary(url, test_name, test_data_object):
+    case_times = test_data_object["success_times"] + test_data_object["fail_times"]
+    if case_times == 0:
+        logger.error(f"no test case finished")
+        return
 
-    for i in range(0, int(total_test_time)):
-        logger.info(f"----------------------------------")
-        logger.info(f"")
-        logger.info(f"")
-        logger.info(f"test case {i} start")
-        if random_change_parameters(template_file_path, i):
-            logger.info(f"random change parameter success")
-        else:
-            logger.error1(f"random change parameter failed")
-            return
-        mesh_generator.mesh_generator_interface(f"{current_time}/{i}/property.json", f"mesh", logger)
-        logger.info(f"mesh generate finish")
-        run_solver(i, template_file_path, test_data_object)
-        logger.info(f"test case {i} finish")
-
-    # 将测试的汇总结果更新到表格
-    success_rate = float(test_data_object["success_times"]/int(total_test_time))
-    average_time = float(test_data_object["all_test_duration"]/int(total_test_time))
+    success_rate = float(test_data_object["success_times"]/case_times)
+    average_time = float(test_data_object["all_test_duration"]/case_times)
     average_success_time = float(test_data_object["success_duration"]/test_data_object["success_times"]) if test_data_object["success_times"] > 0 else -1
     average_fail_time = float(test_data_object["fail_duration"]/test_data_object["fail_times"]) if test_data_object["fail_times"] > 0 else -1
-    template_file_name = template_file_path.split("/")[-1]
-    response = requests.get(url + f"/update_test_summary?name={template_file_name}测试&success_rate={success_rate}&average_time={average_time}&average_success_time={average_success_time}&average_fail_time={average_fail_time}")
-    if response.status_code == 200:
-            logger.info(f"update test summary data success")
+    # 各阶段的总用时与测试总时长对比，求解以外的阶段即为测试工具的开销
+    wall_time = time.time() - test_data_object["start_time"]
+    logger.info(f"test wall time {wall_time}s")
+    for stage_name, stage_stats in test_data_object["stage_times"].items():
+        logger.info(f"stage {stage_name}: total {stage_stats['total']:.3f}s, mean {stage_stats['total'] / stage_stats['count']:.3f}s, max {stage_stats['max']:.3f}s, count {stage_stats['count']}")
+    stage_times = json.dumps({stage_name: round(stage_stats["total"], 3) for stage_name, stage_stats in test_data_object["stage_times"].items()})
+
+    # 更新测试汇总并落地
+    summary = {"name": test_name, "success_rate": success_rate, "average_time": average_time,
+               "average_success_time": average_success_time, "average_fail_time": average_fail_time,
+               "invalid_times": test_data_object["invalid_times"], "wall_time": wall_time, "stage_times": stage_times}
+    if post_test_details_batch([], summary):
+        logger.info(f"update test summary data success")
     else:
         logger.warning(f"update test summary data fail")
 
-    
-    # 将单轮测试结果落地 
-    response = requests.get(url + f"/store_test_summary_data")
-    if response.status_code == 200:
-            logger.info(f"store test summary data success")
+
+# 网格规格维度，搜索失败边界时优先缩小网格，使复现case尽快求解完成
+grid_dimension_names = ["NX", "NY", "NZ"]
+
+
+# 配置中射孔位置在各方向上的最大网格编号，缩小网格时不能小于该编号
+def max_block_index(json_object, block_index=None):
+    if block_index is None:
+        block_index = [1, 1, 1]
+    items = json_object.items() if isinstance(json_object, dict) else enumerate(json_object)
+    for key, value in items:
+        if key == "BlockIdx" and isinstance(value, list):
+            block_index = [max(index, position) for index, position in zip(block_index, value)]
+        elif isinstance(value, (dict, list)):
+            block_index = max_block_index(value, block_index)
+    return block_index
+
+
+# 在求解成功的case中选取测试参数取值与失败case最接近的一个作为参照，距离按各维度取值范围归一化
+def nearest_passed_case(plan, failed_case, passed_cases):
+    def distance(case):
+        total = 0
+        for dimension in plan["dimensions"]:
+            min_value, max_value = dimension["value_range"]
+            if max_value > min_value:
+                total = total + abs(case["values"][dimension["name"]] - failed_case["values"][dimension["name"]]) / (max_value - min_value)
+        return total
+
+    if not passed_cases:
+        return None
+    return min(passed_cases, key=distance)
+
+
+# 失败边界搜索的单次探测：以失败case的种子和给定的测试参数取值生成case并求解，返回是否复现了失败
+# 无法生成或求解被中断时无法判断，返回None
+# 探测case位于失败case文件夹下的 boundary-<序号> 子文件夹中，进程数与失败case相同
+def run_boundary_probe(template_file_path, failed_case, values, probes):
+    probe = {"path": f"boundary-{len(probes)}", "values": dict(values), "result": "unknown", "time": None, "reproduced": None}
+    probes.append(probe)
+    probe_case = {"case_id": f"{failed_case['case_id']}-{probe['path']}", "template": failed_case["template"],
+                  "seed": failed_case["seed"], "design_values": values, "process_num": failed_case["process_num"],
+                  "storage_path": f"{get_case_storage_path(failed_case)}/{probe['path']}"}
+
+    # 网格过小无法按进程数划分时无法生成，结果未知
+    if not random_change_parameters(template_file_path, probe_case):
+        logger.warning(f"boundary probe {probe_case['case_id']} generate failed, values: {values}")
+        return None
+    generate_case_mesh(probe_case)
+
+    acquire_cores(probe_case["process_num"])
+    try:
+        run_solver(probe_case)
+    finally:
+        release_case_mesh(probe_case)
+        release_cores(probe_case["process_num"])
+    clean_case_files(probe_case)
+
+    probe["result"] = probe_case["result"]
+    probe["time"] = probe_case["execution_time"]
+    if probe_case["result"] == "interrupted":
+        return None
+    probe["reproduced"] = probe_case["result"] == failed_case["result"]
+    logger.info(f"boundary probe {probe_case['case_id']} result {probe['result']}, time {probe['time']}, values: {values}")
+    return probe["reproduced"]
+
+
+# 二分查找单个测试参数的失败边界：passing_value 处求解成功，failing_value 处复现失败
+# 返回边界两侧最接近的成功取值和失败取值，整数参数精确到1，浮点参数精确到取值范围的 boundary_tolerance
+# 探测结果未知时停止查找，返回已确定的区间
+def bisect_boundary(reproduce, has_budget, values, name, passing_value, failing_value, value_range):
+    if isinstance(passing_value, int) and isinstance(failing_value, int):
+        tolerance = 1
+    else:
+        tolerance = abs(value_range[1] - value_range[0]) * boundary_tolerance
+    while abs(failing_value - passing_value) > tolerance and has_budget():
+        if isinstance(passing_value, int) and isinstance(failing_value, int):
+            middle = (passing_value + failing_value) // 2
+        else:
+            middle = (passing_value + failing_value) / 2
+        reproduced = reproduce({**values, name: middle})
+        if reproduced is None:
+            break
+        if reproduced:
+            failing_value = middle
+        else:
+            passing_value = middle
+    return passing_value, failing_value
+
+
+# 搜索单个失败case的失败边界，结果记录在case文件夹下的boundary.json中
+# 先确认失败可以复现，然后在射孔位置允许的范围内缩小网格，最后将其余测试参数逐个向参照case的取值移动：
+# 移动到参照值仍失败说明该参数与失败无关，否则二分查找该参数的失败边界
+# 参数移动后的探测结果未知时跳过该参数，保留失败case的取值
+# 只保留最后一次复现失败的探测case作为最小复现case
+def search_failure_boundary(template_file_path, failed_case, passed_case):
+    plan = get_template_plan(template_file_path)
+    dimensions = {dimension["name"]: dimension for dimension in plan["dimensions"]}
+    failed_values = failed_case["values"]
+    passed_values = passed_case["values"]
+    values = dict(failed_values)
+    probes = []
+
+    def has_budget():
+        return len(probes) < boundary_budget
+
+    def reproduce(probe_values):
+        return run_boundary_probe(template_file_path, failed_case, probe_values, probes)
+
+    logger.info(f"search failure boundary of case {failed_case['case_id']}, reference case {passed_case['case_id']}")
+    minimal_probe = None
+    try:
+        reproducible = reproduce(values)
+        culprits = []
+        if reproducible:
+            with open(f"{get_case_storage_path(failed_case)}/property.json", 'r') as f:
+                block_index = max_block_index(json.load(f))
+            for name, lower in zip(grid_dimension_names, block_index):
+                if name not in dimensions or not has_budget():
+                    continue
+                lower = max(lower, dimensions[name]["value_range"][0])
+                if values[name] <= lower:
+                    continue
+                reproduced = reproduce({**values, name: lower})
+                if reproduced is None:
+                    continue
+                if reproduced:
+                    values[name] = lower
+                    continue
+                passed_value, values[name] = bisect_boundary(reproduce, has_budget, values, name, lower, values[name], dimensions[name]["value_range"])
+                culprits.append({"name": name, "passed_value": passed_value, "boundary_value": values[name], "failed_value": failed_values[name]})
+
+            for dimension in plan["dimensions"]:
+                name = dimension["name"]
+                if name in grid_dimension_names or values[name] == passed_values[name]:
+                    continue
+                if not has_budget():
+                    break
+                reproduced = reproduce({**values, name: passed_values[name]})
+                if reproduced is None:
+                    continue
+                if reproduced:
+                    values[name] = passed_values[name]
+                    continue
+                passed_value, values[name] = bisect_boundary(reproduce, has_budget, values, name, passed_values[name], values[name], dimension["value_range"])
+                culprits.append({"name": name, "passed_value": passed_value, "boundary_value": values[name], "failed_value": failed_values[name]})
+        reproduced_probes = [probe for probe in probes if probe["reproduced"] is True]
+        minimal_probe = reproduced_probes[-1] if reproduced_probes else None
+    finally:
+        # 删除最小复现case以外的探测case，搜索出错时删除全部探测case
+        for probe in probes:
+            if probe is not minimal_probe:
+                shutil.rmtree(f"{get_case_storage_path(failed_case)}/{probe['path']}", ignore_errors=True)
+
+    boundary = {"reference_case": passed_case["case_id"], "reproducible": reproducible, "budget_exhausted": not has_budget(),
+                "failed_values": failed_values, "passed_values": passed_values, "minimal_values": values,
+                "minimal_case": minimal_probe["path"] if minimal_probe else None, "culprits": culprits, "probes": probes}
+    with open(f"{get_case_storage_path(failed_case)}/boundary.json", 'w', encoding='utf-8') as f:
+        json.dump(boundary, f, ensure_ascii=False, indent=4)
+    logger.info(f"failure boundary of case {failed_case['case_id']}: reproducible {reproducible}, culprits {[culprit['name'] for culprit in culprits]}, probes {len(probes)}")
+
+
+# 对所有失败case搜索失败边界，各失败case的搜索在总核数预算内并发执行，同时搜索的case数不超过总核数可同时求解的case数
+# 搜索完成后重新打包失败case，使结果包中包含boundary.json和最小复现case
+def run_boundary_searches(template_file_path, finished_cases):
+    plan = get_template_plan(template_file_path)
+    failed_cases = [case for case in finished_cases if case["result"] in boundary_search_results and "values" in case]
+    passed_cases = [case for case in finished_cases if case["result"] == "pass" and "values" in case]
+    if plan is None or not failed_cases:
+        return
+    if not passed_cases:
+        logger.warning(f"no passed case of {template_file_path} as reference, skip failure boundary search")
+        return
+
+    with ThreadPoolExecutor(max_workers=min(len(failed_cases), max(1, total_cores // process_num))) as executor:
+        futures = [executor.submit(search_failure_boundary, template_file_path, case, nearest_passed_case(plan, case, passed_cases)) for case in failed_cases]
+        for future, case in zip(futures, failed_cases):
+            try:
+                future.result()
+                package_case(case)
+            except Exception as e:
+                logger.error(f"failure boundary search of case {case['case_id']} failed, error: {e}")
+
+
+# seeds 不为空时按给定的case种子复现测试
+def run_auto_test(url, template_file_path, total_test_time, seeds=None, test_name=None):
+    global free_cores
+
+    template_file_name = template_file_path.split("/")[-1]
+    if test_name is None:
+        test_name = f"{template_file_name}测试"
+    if init_environment(url, template_file_path, test_name):
+        logger.info(f"environment initial success")
     else:
-        logger.warning(f"store test summary data fail")
+        logger.error(f"environment initial failed")
+        return False
+
+    test_data_object = new_test_data_object()
+    finished_cases = []
+
+    # 按 生成 -> 校验 -> 网格 -> 求解 -> 打包 -> 上报 的流水线执行，各阶段之间使用有界队列衔接，上报队列的长度不小于单批上报的case数
+    # 求解阶段在总核数预算内并发执行，其余阶段在求解期间提前准备下一个case或处理上一个case
+    free_cores = total_cores
+    validate_queue = queue.Queue(maxsize=pipeline_queue_size)
+    mesh_queue = queue.Queue(maxsize=pipeline_queue_size)
+    solve_queue = queue.Queue(maxsize=pipeline_queue_size)
+    package_queue = queue.Queue(maxsize=pipeline_queue_size)
+    report_queue = queue.Queue(maxsize=max(pipeline_queue_size, report_batch_size))
+    stages = [
+        (new_stage("generate", None, validate_queue), generate_cases, (template_file_path, total_test_time, seeds)),
+        (new_stage("validate", validate_queue, mesh_queue), run_pipeline_stage, (validate_case,)),
+        (new_stage("mesh", mesh_queue, solve_queue), run_pipeline_stage, (generate_case_mesh,)),
+        (new_stage("solve", solve_queue, package_queue), solve_cases, ()),
+        (new_stage("package", package_queue, report_queue), package_cases, ()),
+        (new_stage("report", report_queue, None), report_cases_from_queue, (test_data_object, finished_cases)),
+    ]
+    stage_threads = [threading.Thread(target=run_stage, args=(stage, stage_func) + args) for stage, stage_func, args in stages]
+    for stage_thread in stage_threads:
+        stage_thread.start()
+    for stage_thread in stage_threads:
+        stage_thread.join()
+    failed_stages = [stage["name"] for stage, stage_func, args in stages if stage["error"] is not None]
+
+    # 以同一测试中求解成功的case为参照，搜索失败case的失败边界
+    if boundary_search:
+        run_boundary_searches(template_file_path, finished_cases)
 
+    # 将测试的汇总结果更新到表格
+    update_test_summary(url, test_name, test_data_object)
 
     # 发送飞书消息
     #send_message_to_feishu()
 
+    if failed_stages:
+        logger.error(f"test of {template_file_name} stopped early, failed stages: {failed_stages}")
+        return False
+    return True
+
+
+# 按比例放大网格用于弱扩展性测试，NX和NY同比例增加，网格步长按原有步长循环取值
+def scale_grid(project, factor):
+    grid = get_grid(project)
+    nx, ny, nz = get_grid_size(project)
+    new_nx = max(1, round(nx * factor ** 0.5))
+    new_ny = max(1, round(nx * ny * factor / new_nx))
+    grid["IVAR"] = [grid["IVAR"][i % nx] for i in range(new_nx)]
+    grid["JVAR"] = [grid["JVAR"][i % ny] for i in range(new_ny)]
+    grid["NX"] = new_nx
+    grid["NY"] = new_ny
+
+
+# 计算扩展性测试的加速比和并行效率，以第一个求解成功的进程数为基准
+# 强扩展：加速比 = T(基准) / T(n)，理想加速比为 n / 基准进程数
+# 弱扩展：每个进程的网格数不变，加速比按实际网格规模折算，理想情况下求解时间不变
+def compute_scaling_metrics(rows, scaling_type):
+    base_row = None
+    for row in rows:
+        if row["result"] == "pass":
+            base_row = row
+            break
+    for row in rows:
+        if base_row is None or row["result"] != "pass":
+            row["speedup"] = None
+            row["efficiency"] = None
+            continue
+        ideal_speedup = row["process_num"] / base_row["process_num"]
+        if scaling_type == "strong":
+            row["speedup"] = base_row["time"] / row["time"]
+        else:
+            row["speedup"] = row["cells"] / base_row["cells"] * base_row["time"] / row["time"]
+        row["efficiency"] = row["speedup"] / ideal_speedup
+    return rows
+
+
+# 以不同进程数依次求解同一个case（弱扩展时网格规模随进程数放大），结果记录在case文件夹下的scaling.json中
+# 为保证计时准确，各次求解串行执行
+def run_scaling_case(case):
+    current_case_storage_path = get_case_storage_path(case)
+    with open(f"{current_case_storage_path}/property.json", 'r') as f:
+        base_object_js = json.load(f)
+
+    rows = []
+    for num in scaling_ranks:
+        object_js = copy.deepcopy(base_object_js)
+        project = get_project(object_js)
+        run_case = {"case_id": f"{case['case_id']}/{scaling_type}-{num}", "template": case["template"],
+                    "storage_path": f"{current_case_storage_path}/{scaling_type}-{num}", "process_num": num}
+        if scaling_type == "weak":
+            scale_grid(project, num / scaling_ranks[0])
+            set_mesh_file(project)
+        grid_size = get_grid_size(project)
+        run_case["cells"] = grid_size[0] * grid_size[1] * grid_size[2]
+
+        row = {"process_num": num, "cells": run_case["cells"], "time": None, "result": "skip"}
+        rows.append(row)
+        if num > total_cores or not set_process_layout(project, num):
+            logger.warning(f"scaling test of case {case['case_id']} skip process num {num}")
+            continue
+
+        os.makedirs(run_case["storage_path"])
+        with open(f"{run_case['storage_path']}/property.json", 'w', encoding='utf-8') as f:
+            json.dump(object_js, f, ensure_ascii=False, indent=4)
+        mesh_name, hit = acquire_mesh(f"{run_case['storage_path']}/property.json")
+
+        # 重复求解取最短时间，任意一次失败即记为失败
+        times = []
+        for i in range(scaling_repeat):
+            run_solver(run_case, use_cache=False)
+            if run_case["result"] != "pass":
+                break
+            times.append(run_case["execution_time"])
+            append_rank_history(run_case)
+        release_mesh(mesh_name)
+        row["result"] = run_case["result"]
+        row["time"] = min(times) if run_case["result"] == "pass" else run_case["execution_time"]
+        logger.info(f"scaling test of case {case['case_id']}, process num {num}, cells {row['cells']}, time {row['time']}, result {row['result']}")
+
+    compute_scaling_metrics(rows, scaling_type)
+    with open(f"{current_case_storage_path}/scaling.json", 'w', encoding='utf-8') as f:
+        json.dump({"scaling_type": scaling_type, "rows": rows}, f, ensure_ascii=False, indent=4)
+
+    # case的测试结果：所有进程数均求解成功才记为成功，用时取最大进程数的求解时间
+    run_rows = [row for row in rows if row["result"] != "skip"]
+    case["mode"] = "scaling"
+    case["scaling_type"] = scaling_type
+    case["result"] = "pass" if run_rows and all(row["result"] == "pass" for row in run_rows) else "fail"
+    case["execution_time"] = run_rows[-1]["time"] if run_rows else 0
+    case["result_file"] = get_result_file_name(case)
+    return case
+
+
+# 扩展性测试：生成case（或使用指定的配置文件）后，以不同进程数求解并统计加速比和并行效率
+def run_scaling_test(url, template_file_path, total_test_time, property_file_path=None):
+
+    template_file_name = template_file_path.split("/")[-1]
+    test_name = f"{template_file_name}{scaling_type}扩展性测试"
+    if init_environment(url, template_file_path, test_name):
+        logger.info(f"environment initial success")
+    else:
+        logger.error(f"environment initial failed")
+        return
+
+    test_data_object = new_test_data_object()
+    for i in range(0, int(total_test_time)):
+        if shutdown_event.is_set():
+            break
+        logger.info(f"----------------------------------")
+        logger.info(f"scaling test case {i} start")
+        case = {"case_id": i, "template": template_file_name, "process_num": scaling_ranks[0]}
+        if property_file_path is not None:
+            success = copy_case_property(property_file_path, case)
+        else:
+            success = random_change_parameters(template_file_path, case)
+        if not success:
+            logger.error(f"generate scaling test case failed")
+            break
+        if "result" not in validate_case(case):
+            generate_case_mesh(case)
+            run_scaling_case(case)
+            release_case_mesh(case)
+        package_case(case)
+        report_case(case, test_data_object)
+
+    update_test_summary(url, test_name, test_data_object)
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2 == 1:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2
+
+
+# 置换检验：两组求解时间取对数后的均值差异的双侧p值
+# 组合数较少时枚举全部分组，否则用固定种子随机抽样分组
+def permutation_test(times_a, times_b, max_permutations=20000):
+    log_a = [math.log(item) for item in times_a]
+    log_b = [math.log(item) for item in times_b]
+    values = log_a + log_b
+    observed = abs(sum(log_a) / len(log_a) - sum(log_b) / len(log_b))
+
+    def diff(indexes):
+        group_a = [values[i] for i in indexes]
+        group_b_sum = sum(values) - sum(group_a)
+        return abs(sum(group_a) / len(group_a) - group_b_sum / len(log_b))
+
+    if math.comb(len(values), len(log_a)) <= max_permutations:
+        groups = list(itertools.combinations(range(len(values)), len(log_a)))
+    else:
+        rng = random.Random(0)
+        groups = [rng.sample(range(len(values)), len(log_a)) for i in range(max_permutations)]
+    extreme_count = sum(1 for indexes in groups if diff(indexes) >= observed - 1e-12)
+    return extreme_count / len(groups)
+
+
+def geometric_mean(values):
+    return math.exp(sum(math.log(item) for item in values) / len(values))
+
+
+# 对case集合的几何平均加速比做bootstrap，给出95%置信区间
+def bootstrap_geometric_mean(values, times=2000):
+    rng = random.Random(0)
+    means = sorted(geometric_mean([rng.choice(values) for item in values]) for i in range(times))
+    return means[int(times * 0.025)], means[int(times * 0.975) - 1]
+
+
+# 在同一个case上交替运行基准和待测求解器，每个求解器各重复ab_repeat次
+# 奇偶轮次交换两者的先后顺序，减少机器状态漂移对对比结果的影响
+def run_ab_case(case):
+    current_case_storage_path = get_case_storage_path(case)
+    solvers = {"baseline": baseline_solver_path, "candidate": candidate_solver_path}
+    times = {"baseline": [], "candidate": []}
+    results = {"baseline": "pass", "candidate": "pass"}
+
+    for i in range(ab_repeat):
+        labels = ["baseline", "candidate"] if i % 2 == 0 else ["candidate", "baseline"]
+        for label in labels:
+            run_case = {"case_id": f"{case['case_id']}/{label}-{i}", "storage_path": f"{current_case_storage_path}/{label}-{i}",
+                        "process_num": case["process_num"], "solver": solvers[label]}
+            os.makedirs(run_case["storage_path"])
+            shutil.copy(f"{current_case_storage_path}/property.json", f"{run_case['storage_path']}/property.json")
+            run_solver(run_case, use_cache=False)
+            if run_case["result"] != "pass":
+                results[label] = "fail"
+            times[label].append(run_case["execution_time"])
+
+    row = {"case_name": str(case["case_id"]), "baseline_times": times["baseline"], "candidate_times": times["candidate"],
+           "baseline_time": median(times["baseline"]), "candidate_time": median(times["candidate"]),
+           "baseline_result": results["baseline"], "candidate_result": results["candidate"],
+           "speedup": None, "p_value": None}
+
+    # 任一求解器失败时不比较性能，基准成功而待测失败视为退化
+    if results["baseline"] == "pass" and results["candidate"] == "pass":
+        row["speedup"] = row["baseline_time"] / row["candidate_time"]
+        row["p_value"] = permutation_test(times["baseline"], times["candidate"])
+        if row["p_value"] < ab_alpha and row["speedup"] < 1 - ab_threshold:
+            case["result"] = "regressed"
+        elif row["p_value"] < ab_alpha and row["speedup"] > 1 + ab_threshold:
+            case["result"] = "improved"
+        else:
+            case["result"] = "pass"
+    elif results["baseline"] == "pass":
+        case["result"] = "regressed"
+    else:
+        case["result"] = "fail"
+    row["result"] = case["result"]
+
+    case["mode"] = "ab"
+    case["baseline_time"] = row["baseline_time"]
+    case["candidate_time"] = row["candidate_time"]
+    case["speedup"] = row["speedup"]
+    case["p_value"] = row["p_value"]
+    case["execution_time"] = case["candidate_time"]
+    case["result_file"] = get_result_file_name(case)
+    logger.info(f"a/b test of case {case['case_id']}, speedup {row['speedup']}, p value {row['p_value']}, result {case['result']}")
+    return case, row
+
+
+# 列出已有测试结果文件夹中由random_change_parameters生成的case
+def list_source_cases(source_dir):
+    case_ids = []
+    for name in os.listdir(source_dir):
+        if os.path.isfile(os.path.join(source_dir, name, "property.json")):
+            case_ids.append(name)
+    return sorted(case_ids, key=lambda name: (not name.isdigit(), int(name) if name.isdigit() else 0, name))
+
+
+# A/B对比测试：在完全相同的case集合上对比基准和待测求解器的性能
+# 指定source_dir时复用已有测试结果文件夹中的case，否则先按模板生成一组case
+# 结果汇总在测试结果文件夹下的ab_result.json中
+def run_ab_test(url, template_file_path, total_test_time, source_dir=None):
+
+    template_file_name = template_file_path.split("/")[-1]
+    test_name = f"{template_file_name} A/B对比测试"
+    if init_environment(url, template_file_path, test_name):
+        logger.info(f"environment initial success")
+    else:
+        logger.error(f"environment initial failed")
+        return
+
+    # 复用已有case时沿用原case编号
+    if source_dir is not None:
+        source_cases = [(case_id, os.path.join(source_dir, case_id, "property.json")) for case_id in list_source_cases(source_dir)]
+    else:
+        source_cases = [(i, None) for i in range(0, int(total_test_time))]
+
+    test_data_object = new_test_data_object()
+    rows = []
+    for case_id, property_file_path in source_cases:
+        if shutdown_event.is_set():
+            break
+        logger.info(f"----------------------------------")
+        logger.info(f"a/b test case {case_id} start")
+        case = {"case_id": case_id, "template": template_file_name}
+        if property_file_path is not None:
+            # 保持与原case相同的进程数，保证配置完全一致
+            with open(property_file_path, 'r') as f:
+                case["process_num"] = get_project(json.load(f))["solver"]["process_num"]
+            success = copy_case_property(property_file_path, case)
+        else:
+            success = random_change_parameters(template_file_path, case)
+        if not success:
+            logger.error(f"generate a/b test case failed")
+            break
+        if "result" not in validate_case(case):
+            generate_case_mesh(case)
+            case, row = run_ab_case(case)
+            rows.append(row)
+            release_case_mesh(case)
+        package_case(case)
+        report_case(case, test_data_object)
+
+    speedups = [row["speedup"] for row in rows if row["speedup"] is not None]
+    ab_result = {"baseline_solver": baseline_solver_path, "candidate_solver": candidate_solver_path,
+                 "repeat": ab_repeat, "alpha": ab_alpha, "threshold": ab_threshold,
+                 "geometric_mean_speedup": geometric_mean(speedups) if speedups else None,
+                 "geometric_mean_speedup_ci": bootstrap_geometric_mean(speedups) if speedups else None,
+                 "regressed_cases": [row["case_name"] for row in rows if row["result"] == "regressed"],
+                 "improved_cases": [row["case_name"] for row in rows if row["result"] == "improved"],
+                 "cases": rows}
+    with open(f"{current_time}/ab_result.json", 'w', encoding='utf-8') as f:
+        json.dump(ab_result, f, ensure_ascii=False, indent=4)
+    logger.info(f"a/b test finish, geometric mean speedup {ab_result['geometric_mean_speedup']}, regressed cases {ab_result['regressed_cases']}")
+
+    update_test_summary(url, test_name, test_data_object)
+
+
+# 读取测试结果文件夹中各case的case.json，用于复现非随机采样策略生成的case
+def load_replay_cases(source_dir):
+    for name in os.listdir(source_dir):
+        case_file_path = os.path.join(source_dir, name, "case.json")
+        if os.path.isfile(case_file_path):
+            with open(case_file_path, 'r') as f:
+                replay_case = json.load(f)
+            replay_cases[(replay_case["template"], replay_case["seed"])] = replay_case
+    logger.info(f"{len(replay_cases)} cases loaded from {source_dir} for replay")
+
+
+# 只生成case的配置文件，不求解也不上报，可用于提前批量生成整个测试的case，供A/B对比等模式复用
+def generate_cases_only(template_file_path, total_test_time):
+    global current_time
+
+    current_time = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+    if os.path.exists(current_time):
+        logger.warning(f"this test result storage already exits, please check it")
+        return
+    os.makedirs(current_time)
+
+    template_file_name = template_file_path.split("/")[-1]
+    plan = get_template_plan(template_file_path)
+    if plan is None:
+        return
+    case_design_values = design_values(plan, sampling_strategy, int(total_test_time), campaign_seed)
+
+    start_time = time.time()
+    for i in range(0, int(total_test_time)):
+        case = {"case_id": i, "template": template_file_name}
+        case["sampling"] = sampling_strategy
+        if case_design_values is not None:
+            case["design_values"] = case_design_values[i]
+        if not random_change_parameters(template_file_path, case):
+            logger.error(f"random change parameter failed")
+            return
+    logger.info(f"{total_test_time} cases of {template_file_name} generated in {time.time() - start_time}s, path {os.path.abspath(current_time)}")
+
 
 if __name__ == '__main__':
-    argv = sys.argv
-    url = argv[1]
-    template_file_folder = os.path.abspath(argv[2])
-    total_test_time = argv[3]
+    parser = argparse.ArgumentParser(description="solver auto test")
+    parser.add_argument("url", help="test server url, ip + port")
+    parser.add_argument("template_file_folder", help="folder of property template files")
+    parser.add_argument("total_test_time", type=int, help="number of test cases for each template")
+    parser.add_argument("--total-cores", type=int, default=64, help="total cores shared by concurrent cases")
+    parser.add_argument("--process-num", default="64", help="mpi process number of each case, or 'auto' to select it from grid size and history")
+    parser.add_argument("--max-process-num", type=int, default=64, help="upper limit of mpi process number in auto mode")
+    parser.add_argument("--cells-per-process", type=int, default=200, help="target cells per mpi process in auto mode")
+    parser.add_argument("--queue-size", type=int, default=2, help="max cases waiting between pipeline stages")
+    parser.add_argument("--report-batch-size", type=int, default=32, help="max case results reported to the server in one request")
+    parser.add_argument("--mode", choices=["random", "scaling", "ab", "replay", "generate"], default="random", help="random: random parameter test, scaling: strong/weak scaling sweep, ab: compare two solver binaries, replay: regenerate and rerun cases by seed, generate: only generate the cases")
+    parser.add_argument("--solver", default="./oil_solver", help="solver binary")
+    parser.add_argument("--solver-wrapper", default="", help="command placed before the solver inside mpirun, e.g. a profiler")
+    parser.add_argument("--seed", type=int, help="campaign seed, case seeds are derived from it and the case id")
+    parser.add_argument("--sampling", choices=["random", "lhs", "halton", "sobol", "corners"], default="random", help="sampling strategy of the template test items")
+    parser.add_argument("--replay-seed", type=int, nargs="+", help="case seeds to regenerate and rerun in replay mode")
+    parser.add_argument("--replay-template", help="only replay cases of this template file name")
+    parser.add_argument("--replay-source", help="test result folder of the replayed cases, its case.json files give the design values of lhs/halton/sobol/corners cases")
+    parser.add_argument("--scaling-ranks", default="1,2,4,8,16,32,64", help="comma separated process numbers of the scaling sweep")
+    parser.add_argument("--scaling-type", choices=["strong", "weak"], default="strong", help="strong: fixed grid, weak: grid grows with process number")
+    parser.add_argument("--scaling-repeat", type=int, default=1, help="runs of each process number, the shortest time is used")
+    parser.add_argument("--scaling-property", help="use this generated property.json instead of sampling the templates")
+    parser.add_argument("--baseline-solver", default="./oil_solver", help="baseline solver binary of a/b test")
+    parser.add_argument("--candidate-solver", default="./oil_solver", help="candidate solver binary of a/b test")
+    parser.add_argument("--ab-source", help="reuse the cases of this test result folder in a/b test")
+    parser.add_argument("--ab-repeat", type=int, default=5, help="runs of each solver on each case in a/b test, at least 4 for a meaningful p value")
+    parser.add_argument("--ab-alpha", type=float, default=0.05, help="significance level of a/b test")
+    parser.add_argument("--ab-threshold", type=float, default=0.02, help="relative speedup change treated as improvement or regression")
+    parser.add_argument("--timeout", type=float, help="wall clock limit of each solve in seconds, the mpi process group is killed and the case recorded as timeout")
+    parser.add_argument("--stall-timeout", type=float, help="kill the solve and record timeout when output.log gets no output for this many seconds")
+    parser.add_argument("--max-timestep-cuts", type=int, default=20, help="consecutive timestep cuts recorded as diverged, 0 to disable")
+    parser.add_argument("--divergence-pattern", action="append", default=[], help="extra regex of output lines recorded as diverged, NaN residuals are always checked")
+    parser.add_argument("--timestep-cut-pattern", help="regex of the output line of a timestep cut")
+    parser.add_argument("--timestep-pattern", help="regex of the output line of a finished timestep")
+    parser.add_argument("--newton-pattern", help="regex of the newton iteration count in the output, the count is the first group")
+    parser.add_argument("--linear-pattern", help="regex of the linear iteration count in the output, the count is the first group")
+    parser.add_argument("--stress-grid", help="NX,NY,NZ of stress cases, e.g. 500,500,20; the sampled grid and wells are replaced by this grid and --stress-wells wells spread over the mpi partitions")
+    parser.add_argument("--stress-wells", type=int, default=200, help="number of wells of stress cases")
+    parser.add_argument("--stress-perforations", type=int, default=10, help="max perforations of each well of stress cases")
+    parser.add_argument("--mesh-cache-size", type=float, default=10, help="size limit of the mesh cache in GB, least recently used meshes beyond it are deleted")
+    parser.add_argument("--mesh-format", choices=["ascii", "binary"], default="ascii", help="plot3d grid file format, binary is the unformatted fortran record format")
+    parser.add_argument("--skip-validation", action="store_true", help="run generated cases without validating the configuration first")
+    parser.add_argument("--boundary-search", action="store_true", help="search the failure boundary of failed cases by bisecting toward the nearest passed case")
+    parser.add_argument("--boundary-budget", type=int, default=30, help="max probe runs of each failed case in failure boundary search")
+    parser.add_argument("--package-workers", type=int, default=2, help="threads compressing case results in parallel")
+    parser.add_argument("--package-format", choices=["store", "deflate", "bzip2", "lzma", "zstd"], default="deflate", help="compression of the case result package, zstd writes .tar.zst and needs the zstandard package")
+    parser.add_argument("--package-level", type=int, help="compression level of the case result package, default level of the format if not set")
+    parser.add_argument("--keep-files", default=",".join(keep_file_patterns), help="comma separated file name patterns kept in the case result package, other files are deleted")
+    parser.add_argument("--result-cache", action="store_true", help="reuse the result, time and output files of an identical earlier solve (same property.json, mesh, solver binary, process num and environment)")
+    parser.add_argument("--result-cache-path", default="result_cache", help="folder of the solver result cache")
+    parser.add_argument("--result-cache-env", default="OMP_NUM_THREADS", help="comma separated environment variables that are part of the result cache key")
+    args = parser.parse_args()
+
+    url = args.url
+    template_file_folder = os.path.abspath(args.template_file_folder)
+    total_test_time = args.total_test_time
+    total_cores = args.total_cores
+    if args.process_num == "auto":
+        auto_process_num = True
+        process_num = args.max_process_num
+        cells_per_process = args.cells_per_process
+    else:
+        process_num = int(args.process_num)
+    # 任何模式下都会追加历史记录，先读取已有的记录
+    load_rank_history()
+    pipeline_queue_size = args.queue_size
+    report_batch_size = args.report_batch_size
+    scaling_ranks = [int(item) for item in args.scaling_ranks.split(",")]
+    scaling_type = args.scaling_type
+    scaling_repeat = args.scaling_repeat
+    solver_path = args.solver
+    solver_wrapper = args.solver_wrapper.split()
+    campaign_seed = args.seed if args.seed is not None else random.SystemRandom().getrandbits(32)
+    logger.info(f"campaign seed: {campaign_seed}")
+    sampling_strategy = args.sampling
+    if sampling_strategy == "sobol" and qmc is None:
+        logger.error(f"sobol sampling needs scipy, please install it")
+        sys.exit(1)
+    if args.mode == "replay" and not args.replay_seed:
+        logger.error(f"replay mode needs --replay-seed")
+        sys.exit(1)
+    if args.replay_source is not None:
+        load_replay_cases(os.path.abspath(args.replay_source))
+    baseline_solver_path = args.baseline_solver
+    candidate_solver_path = args.candidate_solver
+    ab_repeat = args.ab_repeat
+    ab_alpha = args.ab_alpha
+    ab_threshold = args.ab_threshold
+    solver_timeout = args.timeout
+    stall_timeout = args.stall_timeout
+    max_timestep_cuts = args.max_timestep_cuts
+    divergence_patterns = divergence_patterns + [re.compile(pattern) for pattern in args.divergence_pattern]
+    if args.timestep_cut_pattern is not None:
+        timestep_cut_pattern = re.compile(args.timestep_cut_pattern)
+    if args.timestep_pattern is not None:
+        timestep_pattern = re.compile(args.timestep_pattern)
+    if args.newton_pattern is not None:
+        newton_pattern = re.compile(args.newton_pattern)
+    if args.linear_pattern is not None:
+        linear_pattern = re.compile(args.linear_pattern)
+    if args.stress_grid is not None:
+        stress_grid = [int(item) for item in args.stress_grid.split(",")]
+        stress_well_num = args.stress_wells
+        stress_perforation_max = args.stress_perforations
+        if len(stress_grid) != 3 or min(stress_grid) < 1:
+            logger.error(f"stress grid should be NX,NY,NZ")
+            sys.exit(1)
+        if stress_well_num > stress_grid[0] * stress_grid[1] // 4:
+            logger.error(f"too many stress wells for a {stress_grid[0]} x {stress_grid[1]} grid")
+            sys.exit(1)
+        if args.boundary_search:
+            logger.error(f"failure boundary search does not support stress cases")
+            sys.exit(1)
+    mesh_binary = args.mesh_format == "binary"
+    mesh_cache_size = int(args.mesh_cache_size * 1024 ** 3)
+    os.makedirs(mesh_cache_path, exist_ok=True)
+    validate_generated_cases = not args.skip_validation
+    boundary_search = args.boundary_search
+    boundary_budget = args.boundary_budget
+    package_workers = args.package_workers
+    package_format = args.package_format
+    package_level = args.package_level
+    keep_file_patterns = [pattern for pattern in args.keep_files.split(",") if pattern]
+    if package_format == "zstd" and zstandard is None:
+        logger.error(f"zstd package format needs zstandard, please install it")
+        sys.exit(1)
+    result_cache = args.result_cache
+    result_cache_path = os.path.abspath(args.result_cache_path)
+    result_cache_env = [name for name in args.result_cache_env.split(",") if name]
+    if result_cache:
+        os.makedirs(result_cache_path, exist_ok=True)
+    if process_num > total_cores:
+        logger.error(f"process num {process_num} exceeds total cores {total_cores}")
+        sys.exit(1)
 
      # 执行环境清理，对于单次测试来说，只是简单的把落地文件的内容清空
-    if not clean_up():
-        logger.error(f"re-load data failed")
-        exits(1)
+    if args.mode != "generate" and not clean_up():
+        logger.error(f"clean up data failed")
+        sys.exit(1)
+
+    signal.signal(signal.SIGINT, handle_shutdown_signal)
+    signal.signal(signal.SIGTERM, handle_shutdown_signal)
 
+    if args.mode == "scaling" and args.scaling_property is not None:
+        run_scaling_test(url, os.path.abspath(args.scaling_property), total_test_time, os.path.abspath(args.scaling_property))
+        sys.exit(130 if shutdown_event.is_set() else 0)
+
+    if args.mode == "ab" and args.ab_source is not None:
+        source_dir = os.path.abspath(args.ab_source)
+        run_ab_test(url, source_dir, total_test_time, source_dir)
+        sys.exit(130 if shutdown_event.is_set() else 0)
+
+    success = True
     for file in os.listdir(template_file_folder):
+        if shutdown_event.is_set():
+            break
         file_path = os.path.join(template_file_folder, file)
         if os.path.isfile(file_path):
-            run_auto_test(url, file_path, total_test_time)
-
+            if args.replay_template is not None and file != args.replay_template:
+                continue
+            if args.mode == "scaling":
+                run_scaling_test(url, file_path, total_test_time)
+            elif args.mode == "ab":
+                run_ab_test(url, file_path, total_test_time)
+            elif args.mode == "generate":
+                generate_cases_only(file_path, total_test_time)
+            elif args.mode == "replay":
+                success = run_auto_test(url, file_path, len(args.replay_seed), args.replay_seed, f"{file}复现测试") and success
+            else:
+                success = run_auto_test(url, file_path, total_test_time) and success
+    # 测试被信号停止或有流水线阶段异常退出时以非零状态退出
+    if shutdown_event.is_set():
+        sys.exit(130)
+    if not success:
+        sys.exit(1)
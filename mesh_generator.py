@@ -1,13 +1,103 @@
 #!/usr/bin/python3
 import sys
+import os
+import time
+import tempfile
+import tracemalloc
+import argparse
 import numpy as np
 from itertools import chain
 import json
 import logging
 
-out_put_path = ""
 
-def generate_block(dim, domain_offset, grid_size, steps, name):
+def axis_coordinates(dim, domain_offset, steps):
+    """
+    Vertex coordinates along each grid direction.
+
+    The grid is a tensor product of these axes, so every vertex coordinate
+    in direction d is one of the values of axis d.
+    """
+    return [np.concatenate(([domain_offset[i]], np.cumsum(steps[i]) + domain_offset[i])) for i in range(dim)]
+
+
+def write_ascii_coordinates(f, axes, vertex_shape, chunk_size=65536):
+    """
+    Writes the coordinates of all vertices in Plot3D ASCII format.
+
+    One line per dimension, vertices in Fortran order (first index fastest).
+    Each axis value is formatted once and the line is assembled by repetition:
+    in direction d every value repeats prod(vertex_shape[:d]) times and the
+    whole sequence repeats prod(vertex_shape[d+1:]) times. The output is
+    byte-identical to formatting every vertex with "%.18lf".
+
+    The line is streamed in pieces of at most chunk_size values, so memory
+    use does not depend on the grid size.
+    """
+    for d in range(len(axes)):
+        inner = int(np.prod(vertex_shape[:d]))
+        outer = int(np.prod(vertex_shape[d + 1:]))
+        axis_strings = ["%.18lf" % item for item in axes[d]]
+
+        # Small blocks (one pass over the axis) are grouped into chunks written repeatedly
+        if len(axis_strings) * inner <= chunk_size:
+            block = " ".join(" ".join([item] * inner) for item in axis_strings)
+            blocks_per_chunk = max(1, min(outer, chunk_size // (len(axis_strings) * inner)))
+            chunk = " ".join([block] * blocks_per_chunk)
+            for i in range(outer // blocks_per_chunk):
+                f.write(chunk if i == 0 else " " + chunk)
+            if outer % blocks_per_chunk:
+                rest = " ".join([block] * (outer % blocks_per_chunk))
+                f.write(rest if outer < blocks_per_chunk else " " + rest)
+        # Large blocks are written value run by value run
+        else:
+            first = True
+            for i in range(outer):
+                for item in axis_strings:
+                    for start in range(0, inner, chunk_size):
+                        run = " ".join([item] * min(chunk_size, inner - start))
+                        f.write(run if first else " " + run)
+                        first = False
+        f.write("\n")
+
+
+def write_fortran_record(f, array):
+    """
+    Writes an array as one Fortran unformatted sequential record.
+    """
+    marker = np.array([array.nbytes], dtype=np.int32)
+    marker.tofile(f)
+    array.tofile(f)
+    marker.tofile(f)
+
+
+def write_binary_coordinates(f, axes, vertex_shape, chunk_size=262144):
+    """
+    Writes a single block Plot3D file in unformatted (Fortran record) format.
+
+    Records: block count, vertex shape (int32), then x, y, z of all vertices
+    (float64, Fortran order) in one record. The coordinate record is streamed
+    in pieces of at most chunk_size values.
+    """
+    vertex_count = int(np.prod(vertex_shape))
+    record_size = vertex_count * len(axes) * 8
+    if record_size > np.iinfo(np.int32).max:
+        raise ValueError("Grid too large for a single Fortran record, use the ASCII format")
+    write_fortran_record(f, np.array([1], dtype=np.int32))
+    write_fortran_record(f, np.asarray(vertex_shape, dtype=np.int32))
+
+    marker = np.array([record_size], dtype=np.int32)
+    marker.tofile(f)
+    for d in range(len(axes)):
+        inner = int(np.prod(vertex_shape[:d]))
+        axis = np.asarray(axes[d], dtype=np.float64)
+        for start in range(0, vertex_count, chunk_size):
+            index = np.arange(start, min(start + chunk_size, vertex_count)) // inner % len(axis)
+            axis[index].tofile(f)
+    marker.tofile(f)
+
+
+def generate_block(dim, domain_offset, grid_size, steps, name, out_put_path, binary=False):
     """
     Generates grid files based on dimensions and grid properties.
 
@@ -15,36 +105,33 @@ def generate_block(dim, domain_offset, grid_size, steps, name):
     :param grid_size: Number of cells in each grid direction (int)
     :param steps: Step sizes for each dimension
     :param name: Name for the generated files
+    :param out_put_path: Folder the files are written to
+    :param binary: Write the Plot3D file in unformatted (Fortran record) format
     """
-    global out_put_path
-
     # Validate the dimension
     if dim not in [1, 2, 3]:
         raise ValueError("Dimension must be 1, 2, or 3")
 
-    for i in range(dim):
-        s = np.concatenate(([domain_offset[i]], np.cumsum(steps[i]) + domain_offset[i]))
-    
     # Create the grid points
-    vertex_coords = np.meshgrid(*[np.concatenate(([domain_offset[i]], np.cumsum(steps[i]) + domain_offset[i])) for i in range(dim)], indexing="ij")
+    axes = axis_coordinates(dim, domain_offset, steps)
 
     vertex_shape = grid_size + 1
 
     shape_string = " ".join(str(item) for item in vertex_shape)
 
     # Write to the plot3d file
-    plot3d_filename = out_put_path +  f"{name}.x"
-    with open(plot3d_filename, "w") as f:
-        f.write("1\n")
-        f.write(f"{shape_string}\n")
-
-        for d in range(dim):
-            f.write(" ".join(("%.18lf" % item)
-                    for item in np.transpose(vertex_coords[d], axes=np.arange(dim)[::-1]).reshape(-1)))
-            f.write("\n")
+    plot3d_filename = os.path.join(out_put_path, f"{name}.x")
+    if binary:
+        with open(plot3d_filename, "wb") as f:
+            write_binary_coordinates(f, axes, vertex_shape)
+    else:
+        with open(plot3d_filename, "w") as f:
+            f.write("1\n")
+            f.write(f"{shape_string}\n")
+            write_ascii_coordinates(f, axes, vertex_shape)
 
     # Write to the gridgen boundary file
-    gridgen_filename = out_put_path + f"{name}.inp"
+    gridgen_filename = os.path.join(out_put_path, f"{name}.inp")
     with open(gridgen_filename, "w") as f:
         f.write("1\n")
         f.write("1\n")
@@ -70,7 +157,7 @@ def generate_block(dim, domain_offset, grid_size, steps, name):
 
 
 
-def generate_mesh(property_file_path, logger):
+def generate_mesh(property_file_path, out_put_path, logger, binary=False):
     with open(property_file_path, 'r') as json_file:
                 data = json.load(json_file)
                 logger.info("property.json loaded successfully")
@@ -94,20 +181,89 @@ def generate_mesh(property_file_path, logger):
 
     domain_offset = np.zeros(3)
     plot3d_filename, gridgen_filename = generate_block(
-        3, domain_offset, grid_size, steps, grid_name)
+        3, domain_offset, grid_size, steps, grid_name, out_put_path, binary)
     logger.info(f"Generated files: {plot3d_filename}, {gridgen_filename}")
 
 
-def mesh_generator_interface(property_file_path_rel, out_put_path_rel, new_logger):
-    global out_put_path
-    property_file_path = property_file_path_rel
-    out_put_path = out_put_path_rel + "/"
-    generate_mesh(property_file_path, new_logger)
+# The output folder is passed down explicitly so different meshes can be generated in parallel threads
+def mesh_generator_interface(property_file_path_rel, out_put_path_rel, new_logger, binary=False):
+    generate_mesh(property_file_path_rel, out_put_path_rel, new_logger, binary)
+
+
+def write_ascii_coordinates_reference(f, axes, vertex_shape):
+    """
+    Per-vertex ASCII writer, kept as the reference for the benchmark.
+    """
+    vertex_coords = np.meshgrid(*axes, indexing="ij")
+    dim = len(axes)
+    for d in range(dim):
+        f.write(" ".join(("%.18lf" % item)
+                for item in np.transpose(vertex_coords[d], axes=np.arange(dim)[::-1]).reshape(-1)))
+        f.write("\n")
+
+
+def benchmark(sizes, nz=10, reference_max_cells=1000000, logger=None):
+    """
+    Measures the Plot3D write time and peak traced memory of each writer for n x n x nz grids.
+
+    The reference writer only runs up to reference_max_cells cells, its output
+    is compared with the ASCII writer to check they are byte-identical.
+
+    :return: One row per grid size with the cell count, the time and peak memory (bytes) of each writer
+    """
+    rng = np.random.default_rng(0)
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for n in sizes:
+            grid_size = np.array([n, n, nz])
+            steps = [rng.uniform(1, 100, size) for size in grid_size]
+            axes = axis_coordinates(3, np.zeros(3), steps)
+            vertex_shape = grid_size + 1
+            row = {"cells": int(np.prod(grid_size)), "reference": None, "ascii": None, "binary": None, "identical": None,
+                   "reference_memory": None, "ascii_memory": None, "binary_memory": None}
+
+            writers = [("ascii", "w", write_ascii_coordinates), ("binary", "wb", write_binary_coordinates)]
+            if row["cells"] <= reference_max_cells:
+                writers.append(("reference", "w", write_ascii_coordinates_reference))
+            for writer_name, mode, writer in writers:
+                tracemalloc.start()
+                start_time = time.time()
+                with open(os.path.join(directory, writer_name), mode) as f:
+                    writer(f, axes, vertex_shape)
+                row[writer_name] = time.time() - start_time
+                row[f"{writer_name}_memory"] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+            if row["reference"] is not None:
+                with open(os.path.join(directory, "ascii"), "rb") as f_ascii, open(os.path.join(directory, "reference"), "rb") as f_reference:
+                    row["identical"] = f_ascii.read() == f_reference.read()
+            rows.append(row)
+            if logger is not None:
+                logger.info(f"benchmark {row}")
+    return rows
+
 
 if __name__ == "__main__":
-    args = sys.argv
-    property_file_path = args[1]
-    out_put_path = args[2]
-    generate_mesh(property_file_path)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    logger = logging.getLogger(__name__)
+
+    parser = argparse.ArgumentParser(description="plot3d mesh generator")
+    parser.add_argument("property_file_path", nargs="?", help="property.json describing the grid")
+    parser.add_argument("out_put_path", nargs="?", default=".", help="output folder of the mesh files")
+    parser.add_argument("--binary", action="store_true", help="write the plot3d file in unformatted (fortran record) format")
+    parser.add_argument("--benchmark", action="store_true", help="measure write time versus grid size instead of generating a mesh")
+    parser.add_argument("--benchmark-sizes", default="10,30,100,300,1000", help="comma separated n of the n x n x 10 benchmark grids")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        print(f"{'cells':>12} {'reference':>20} {'ascii':>20} {'binary':>20} {'identical':>10}")
+        for row in benchmark([int(item) for item in args.benchmark_sizes.split(",")]):
+            columns = ["-" if row[key] is None else f"{row[key]:.3f}s/{row[key + '_memory'] / 1048576:.1f}MB" for key in ["reference", "ascii", "binary"]]
+            print(f"{row['cells']:>12} {columns[0]:>20} {columns[1]:>20} {columns[2]:>20} {str(row['identical']):>10}")
+        sys.exit(0)
+
+    if args.property_file_path is None:
+        parser.error("property_file_path is required")
+    mesh_generator_interface(args.property_file_path, args.out_put_path, logger, args.binary)
 
 
@@ -2,30 +2,185 @@
 # -*- coding: utf-8 -*-
 
 # server.py
-from flask import Flask, render_template, request, send_from_directory, jsonify, render_template_string
+from flask import Flask, render_template, request, send_from_directory, jsonify, stream_template_string, g, Response
 import os
 import json
 import sys
+import threading
+import time
+import sqlite3
+import re
+import codecs
+import zipfile
+from collections import OrderedDict, deque
 
 app = Flask(__name__)
 
-# 测试数据存储
+# 测试数据存储，test_details只缓存最近查看的case结果查询（以测试id和查询参数为键），按最近使用的顺序排列
 test_summary_data = {}
-test_details = {}
+test_details = OrderedDict()
+test_details_cache_size = 16
+# 测试详情的分页查询：默认每页case数、每页最多case数，以及可用于排序的字段（报告顺序和求解用时）
+test_details_page_size = 100
+test_details_max_page_size = 1000
+test_details_sort_columns = {"id": "id", "time": "execution_time"}
+# 展示文件时每次读取的字节数
+show_file_chunk_size = 64 * 1024
 test_summary_data_file = ""
 test_details_file = ""
 g_template_file_name = ""
+# 测试数据落地在SQLite数据库中，每条测试汇总和case结果单独写入，各写接口在返回前提交，批量上报的所有写入在一个事务中提交
+# test_summary_data_file和test_details_file为旧的json落地文件，首次启动时导入数据库
+test_data_db_file = ""
+db_connection = None
+# 修改并落地测试数据的锁，批量上报时在持有锁的情况下逐条写入
+test_data_lock = threading.RLock()
+
+# 监控指标，仅保存在内存中，server重启后清零
+# 直方图的桶上限（秒），覆盖从请求处理到长时间求解的用时
+metrics_buckets = [0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 600, 1800, 3600]
+metrics_lock = threading.Lock()
+# 指标名 -> {"help": 说明, "type": counter/histogram, "values": {标签元组: 值}}
+metrics = {}
+
+
+def register_metric(name, metric_type, help_text):
+    metrics[name] = {"help": help_text, "type": metric_type, "values": {}}
+
+
+register_metric("autotest_cases_total", "counter", "Test cases reported, by result.")
+register_metric("autotest_case_duration_seconds", "histogram", "Solver execution time of reported test cases.")
+register_metric("autotest_stage_duration_seconds", "histogram", "Time spent in each stage of the test pipeline per case.")
+register_metric("autotest_campaigns_total", "counter", "Test campaigns started.")
+register_metric("autotest_http_request_duration_seconds", "histogram", "Time spent handling HTTP requests, by endpoint.")
+register_metric("autotest_client_request_duration_seconds", "histogram", "Time the test harness spent on HTTP requests to the server, by request.")
+
+
+def increase_counter(name, labels=(), value=1):
+    with metrics_lock:
+        values = metrics[name]["values"]
+        values[labels] = values.get(labels, 0) + value
+
+
+def observe_histogram(name, value, labels=()):
+    with metrics_lock:
+        values = metrics[name]["values"]
+        if labels not in values:
+            values[labels] = {"buckets": [0] * len(metrics_buckets), "sum": 0, "count": 0}
+        histogram = values[labels]
+        for i, bucket in enumerate(metrics_buckets):
+            if value <= bucket:
+                histogram["buckets"][i] = histogram["buckets"][i] + 1
+        histogram["sum"] = histogram["sum"] + value
+        histogram["count"] = histogram["count"] + 1
+
+
+def format_labels(labels, extra=()):
+    labels = tuple(labels) + tuple(extra)
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+# 按Prometheus文本格式输出全部指标
+def format_metrics():
+    lines = []
+    with metrics_lock:
+        for name, metric in metrics.items():
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['type']}")
+            for labels, value in metric["values"].items():
+                if metric["type"] == "counter":
+                    lines.append(f"{name}{format_labels(labels)} {value}")
+                    continue
+                for bucket, bucket_count in zip(metrics_buckets, value["buckets"]):
+                    lines.append(f"{name}_bucket{format_labels(labels, [('le', bucket)])} {bucket_count}")
+                lines.append(f"{name}_bucket{format_labels(labels, [('le', '+Inf')])} {value['count']}")
+                lines.append(f"{name}_sum{format_labels(labels)} {value['sum']}")
+                lines.append(f"{name}_count{format_labels(labels)} {value['count']}")
+    return "\n".join(lines) + "\n"
+
+
+# 将"12.3s"形式的用时转换为秒数，无法转换时返回None
+def parse_seconds(value):
+    try:
+        return float(str(value).rstrip("s"))
+    except ValueError:
+        return None
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start_time = time.time()
+
+
+@app.after_request
+def record_request_time(response):
+    if "request_start_time" in g:
+        endpoint = request.endpoint or "unknown"
+        observe_histogram("autotest_http_request_duration_seconds", time.time() - g.request_start_time, (("endpoint", endpoint),))
+    return response
+
+
+# 路由：Prometheus监控指标
+@app.route('/metrics')
+def show_metrics():
+    return Response(format_metrics(), mimetype="text/plain; version=0.0.4")
 
 # 路由：测试汇总页面
 @app.route('/')
 def index():
     return render_template('index.html', tests=test_summary_data)
 
-# 路由：测试详情页面
+# 路由：测试详情页面，支持分页、按用时排序以及按测试结果和错误信息过滤，参数见parse_test_details_query
 @app.route('/test_detail/<test_id>')
 def test_detail(test_id):
-    cases = test_details.get(test_id, [])
-    return render_template('test_detail.html', cases=cases, test_id = test_id)
+    try:
+        query = parse_test_details_query(request.args)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    details = query_test_details(test_id, query)
+    cases = details["cases"]
+
+    # 扩展性测试的结果存放在case文件夹下的scaling.json中
+    scaling_results = {}
+    for case in cases:
+        if case.get("mode") == "scaling":
+            scaling_file_path = os.path.join(app.root_path, test_id, case["case_name"], "scaling.json")
+            if os.path.isfile(scaling_file_path):
+                with open(scaling_file_path, 'r') as f:
+                    scaling_results[case["case_name"]] = json.load(f)
+
+    # 失败case的失败边界搜索结果存放在case文件夹下的boundary.json中
+    boundary_results = {}
+    for case in cases:
+        if case.get("result") != "pass":
+            boundary_file_path = os.path.join(app.root_path, test_id, case["case_name"], "boundary.json")
+            if os.path.isfile(boundary_file_path):
+                with open(boundary_file_path, 'r') as f:
+                    boundary_results[case["case_name"]] = json.load(f)
+
+    # A/B对比测试的结果存放在测试结果文件夹下的ab_result.json中
+    ab_result = None
+    ab_result_file_path = os.path.join(app.root_path, test_id, "ab_result.json")
+    if os.path.isfile(ab_result_file_path):
+        with open(ab_result_file_path, 'r') as f:
+            ab_result = json.load(f)
+    page_count = max(1, (details["total"] + query["page_size"] - 1) // query["page_size"])
+    return render_template('test_detail.html', cases=cases, test_id = test_id, scaling_results=scaling_results, ab_result=ab_result, boundary_results=boundary_results,
+                           query=query, total=details["total"], page_count=page_count, result_counts=details["result_counts"])
+
+
+# 路由：测试详情的json接口，参数与测试详情页面相同，如 ?sort=time&order=desc&page_size=10 获取用时最长的10个case
+@app.route('/api/test_detail/<test_id>')
+def test_detail_api(test_id):
+    try:
+        query = parse_test_details_query(request.args)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    details = query_test_details(test_id, query)
+    return jsonify({"test_id": test_id, "total": details["total"], "page": query["page"], "page_size": query["page_size"],
+                    "result_counts": details["result_counts"], "cases": details["cases"]})
 
 # 路由：下载落地文件
 @app.route('/download/<test_id>/<file_name>')
@@ -34,50 +189,183 @@ def download_file(test_id, file_name):
     directory = os.path.join(app.root_path)
     return send_from_directory(directory, test_id + "/" +file_name, as_attachment=True)
 
-# 展示求解日志，模板文件和配置文件
-@app.route('/show_file/<test_id>/<case_id>/<file_name>')
-def show_file(test_id, case_id, file_name):
-    
-    # 文件存储目录
+# 打开case文件夹中的文件，返回 (二进制文件对象, 文件大小)，不存在时返回None
+# case文件夹清理后从case的结果包（zip）中读取；file_name 可以包含case文件夹下的子文件夹
+def open_case_file(test_id, case_id, file_name):
     directory = os.path.join(app.root_path)
-    file_path = os.path.join(directory, test_id, case_id, file_name)
+    case_path = os.path.join(os.path.abspath(directory), test_id, case_id)
+    file_path = os.path.abspath(os.path.join(case_path, file_name))
+    if not file_path.startswith(case_path + os.sep):
+        return None
+    if os.path.isfile(file_path):
+        return open(file_path, 'rb'), os.path.getsize(file_path)
+
+    zip_file_path = os.path.join(directory, test_id, case_id + ".zip")
+    if not os.path.isfile(zip_file_path):
+        return None
+    # 关闭zip包后已打开的文件仍可读取
+    with zipfile.ZipFile(zip_file_path) as zip_file:
+        try:
+            info = zip_file.getinfo(os.path.relpath(file_path, case_path).replace(os.sep, "/"))
+        except KeyError:
+            return None
+        return zip_file.open(info), info.file_size
+
+
+# 按块读取文件，从当前位置起最多读取length字节（为None时读到文件末尾），读完后关闭文件
+def read_file_chunks(file, length=None):
+    try:
+        while length is None or length > 0:
+            chunk = file.read(show_file_chunk_size if length is None else min(show_file_chunk_size, length))
+            if not chunk:
+                break
+            if length is not None:
+                length = length - len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+# 将字节块按utf-8解码为文本块，多字节字符可以跨块
+def decode_chunks(chunks):
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    yield decoder.decode(b"", final=True)
+
+
+# 读取文件的最后line_num行，磁盘文件从末尾向前按块读取，zip包中的文件不能高效地向前读取，顺序读取并保留最后line_num行
+def read_tail_lines(file, file_size, line_num):
     try:
-        # 读取文件内容
-        with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()
-        # 将文件内容展示在网页上
-        return render_template_string("""
+        if not isinstance(file, zipfile.ZipExtFile):
+            position = file_size
+            data = b""
+            while position > 0 and data.count(b"\n") <= line_num:
+                read_size = min(show_file_chunk_size, position)
+                position = position - read_size
+                file.seek(position)
+                data = file.read(read_size) + data
+            lines = re.findall(rb"[^\n]*\n|[^\n]+$", data)
+            return lines[-line_num:] if line_num > 0 else []
+        return list(deque(file, maxlen=line_num))
+    finally:
+        file.close()
+
+
+# 逐行查找匹配正则表达式的行，输出时带行号，最多输出max_count行（为None时不限制）
+def grep_lines(file, pattern, max_count=None):
+    try:
+        count = 0
+        for line_number, line in enumerate(file, 1):
+            line = line.decode("utf-8", errors="replace")
+            if pattern.search(line):
+                yield f"{line_number}: {line}" if line.endswith("\n") else f"{line_number}: {line}\n"
+                count = count + 1
+                if max_count is not None and count >= max_count:
+                    break
+    finally:
+        file.close()
+
+
+# 以字节块流式返回文件内容，支持单个区间的HTTP Range请求
+def stream_file_range(file, file_size):
+    headers = {"Accept-Ranges": "bytes"}
+    if request.range is None:
+        headers["Content-Length"] = str(file_size)
+        return Response(read_file_chunks(file), mimetype="text/plain", headers=headers)
+
+    content_range = request.range.range_for_length(file_size)
+    if content_range is None:
+        file.close()
+        headers["Content-Range"] = f"bytes */{file_size}"
+        return Response(status=416, headers=headers)
+    start, stop = content_range
+    file.seek(start)
+    headers["Content-Range"] = f"bytes {start}-{stop - 1}/{file_size}"
+    headers["Content-Length"] = str(stop - start)
+    return Response(read_file_chunks(file, stop - start), status=206, mimetype="text/plain", headers=headers)
+
+
+# 展示求解日志，模板文件和配置文件，文件内容流式输出，不整体读入内存
+# 参数：tail=N 只展示最后N行，grep=正则表达式 只展示匹配的行（带行号，max_count限制行数），raw=1 以纯文本返回
+# 带Range请求头时按字节区间返回纯文本，用于分段查看大文件
+@app.route('/show_file/<test_id>/<case_id>/<path:file_name>')
+def show_file(test_id, case_id, file_name):
+    case_file = open_case_file(test_id, case_id, file_name)
+    if case_file is None:
+        return  jsonify({"message":f"File '{file_name}' not found"}), 404
+    file, file_size = case_file
+
+    try:
+        tail = request.args.get("tail", type=int)
+        grep = request.args.get("grep")
+        pattern = re.compile(grep) if grep else None
+        max_count = request.args.get("max_count", type=int)
+    except re.error as e:
+        file.close()
+        return jsonify({"message": f"invalid grep pattern: {e}"}), 400
+
+    if request.range is not None or (request.args.get("raw") and tail is None and pattern is None):
+        return stream_file_range(file, file_size)
+    if tail is not None:
+        content = decode_chunks([b"".join(read_tail_lines(file, file_size, max(tail, 0)))])
+    elif pattern is not None:
+        content = grep_lines(file, pattern, max_count)
+    else:
+        content = decode_chunks(read_file_chunks(file))
+    if request.args.get("raw"):
+        return Response(content, mimetype="text/plain")
+
+    # 将文件内容展示在网页上
+    return Response(stream_template_string("""
         <html>
         <head><title>File Content</title></head>
         <body>
             <h1>File: {{ file_name }}</h1>
-            <pre>{{ content }}</pre>
+            <p>{{ file_size }} bytes |
+            <a href="?tail=200">最后200行</a> |
+            <a href="?raw=1">纯文本</a> |
+            <form method="get" style="display: inline">grep <input type="text" name="grep" value="{{ grep or '' }}"><input type="submit" value="查找"></form></p>
+            <pre>{% for text in content %}{{ text }}{% endfor %}</pre>
         </body>
         </html>
-        """, file_name=file_name, content=content)
-    except FileNotFoundError:
-        return  jsonify({"message":f"File '{file_name}' not found"}), 404
+        """, file_name=file_name, file_size=file_size, grep=grep, content=content))
 
 
 @app.route('/update_test_summary', methods=['GET'])
 def update_test_summary():
+    with test_data_lock:
+        json_obj = update_test_summary_item(request.args)
+        commit_test_data()
+    return jsonify({"message": "test summary updated successfully!", "new item": json_obj})
 
-    name = request.args.get('name')
-    success_rate = request.args.get('success_rate')
-    average_time = request.args.get('average_time')
-    average_success_time = request.args.get('average_success_time')
-    average_fail_time = request.args.get('average_fail_time')
 
-    json_obj = {}
-    json_obj["time"] = test_summary_data[name]["time"]
-    json_obj["link"] = test_summary_data[name]["link"]
+# 更新测试汇总条目，args为请求参数或批量上报中的summary对象
+def update_test_summary_item(args):
+
+    name = args.get('name')
+    success_rate = args.get('success_rate')
+    average_time = args.get('average_time')
+    average_success_time = args.get('average_success_time')
+    average_fail_time = args.get('average_fail_time')
+
+    # 保留创建条目时记录的其余信息，如测试种子和采样策略
+    json_obj = dict(test_summary_data[name])
     json_obj["success_rate"] = str(float(success_rate)*100) + "%" 
     json_obj["average_time"] = average_time
     json_obj["average_success_time"] = average_success_time
     json_obj["average_fail_time"] = average_fail_time
+    json_obj["invalid_times"] = args.get('invalid_times')
+    # 测试总时长和各阶段的总用时
+    json_obj["wall_time"] = args.get('wall_time')
+    json_obj["stage_times"] = args.get('stage_times')
 
-    test_summary_data[name] = json_obj
-    return jsonify({"message": "test summary updated successfully!", "new item": json_obj})
+    with test_data_lock:
+        test_summary_data[name] = json_obj
+        save_test_summary_item(name, json_obj)
+    return json_obj
 
 
 @app.route('/append_test_summary', methods=['GET'])
@@ -94,79 +382,284 @@ def append_test_summary():
     json_obj["average_time"] = ""
     json_obj["average_success_time"] = ""
     json_obj["average_fail_time"] = ""
-    test_summary_data[name]=json_obj
+
+    # 其余参数作为测试的附加信息一并记录，如测试种子和采样策略
+    for key, value in request.args.items():
+        if key != "name" and key not in json_obj:
+            json_obj[key] = value
+    with test_data_lock:
+        test_summary_data[name]=json_obj
+        save_test_summary_item(name, json_obj)
+        commit_test_data()
+    increase_counter("autotest_campaigns_total")
     return jsonify({"message": "test summary added successfully!", "new item": json_obj})
 
 
 @app.route('/append_test_details', methods=['GET'])
 def append_test_details():
+    with test_data_lock:
+        json_obj = append_test_detail(request.args.get('test_id'), request.args)
+        commit_test_data()
+    observe_test_detail(request.args)
+    return jsonify({"message": "test details added successfully!", "new item": json_obj})
 
-    test_id = request.args.get('test_id')
-    case_name = request.args.get('case_name')
-    result = request.args.get('result')
-    time = request.args.get('time')
-    result_file = request.args.get('result_file')
 
-    if test_id not in test_details:
-        test_details[test_id] = []
+# 批量上报：请求体为 {"test_id": 测试id, "cases": [case结果], "summary": 测试汇总（可选）, "request_times": 客户端请求用时（可选）}
+# 所有case结果和汇总在一次操作中写入并落地，case结果的格式与append_test_details的参数相同
+# request_times为[{"request": 请求名, "seconds": 用时}]，计入客户端请求用时的监控指标
+@app.route('/append_test_details_batch', methods=['POST'])
+def append_test_details_batch():
+    batch = request.get_json(silent=True)
+    if not isinstance(batch, dict) or not isinstance(batch.get("cases", []), list):
+        return jsonify({"message": "request body should be a json object with a cases list"}), 400
+    cases = batch.get("cases", [])
+    summary = batch.get("summary")
+    request_times = batch.get("request_times", [])
+    # 写入前先校验整批数据，避免写入一半后才因格式错误失败
+    if cases and batch.get("test_id") is None:
+        return jsonify({"message": "test_id is required"}), 400
+    if not all(isinstance(case, dict) for case in cases):
+        return jsonify({"message": "each case should be a json object"}), 400
+    if summary is not None:
+        if not isinstance(summary, dict):
+            return jsonify({"message": "summary should be a json object"}), 400
+        if summary.get("name") not in test_summary_data:
+            return jsonify({"message": f"test summary '{summary.get('name')}' not found"}), 404
+        try:
+            float(summary.get("success_rate"))
+        except (TypeError, ValueError):
+            return jsonify({"message": "summary success_rate should be a number"}), 400
+    if not isinstance(request_times, list) or not all(isinstance(item, dict) and isinstance(item.get("seconds"), (int, float)) for item in request_times):
+        return jsonify({"message": "request_times should be a list of {request, seconds} objects"}), 400
+
+    # 写入出错时回滚整批写入，并从数据库重新加载内存中的测试数据
+    # 与请求参数一致，case结果的取值均按字符串保存，空值不保存
+    cases = [{key: str(value) for key, value in case.items() if value is not None} for case in cases]
+    with test_data_lock:
+        try:
+            for case in cases:
+                append_test_detail(batch["test_id"], case)
+            if summary is not None:
+                update_test_summary_item({key: str(value) for key, value in summary.items() if value is not None})
+            commit_test_data()
+        except Exception:
+            db_connection.rollback()
+            load_data()
+            raise
+    # 提交成功后再计入监控指标，回滚的case不计入
+    for case in cases:
+        observe_test_detail(case)
+    for item in request_times:
+        observe_histogram("autotest_client_request_duration_seconds", item["seconds"], (("request", str(item.get("request"))),))
+    return jsonify({"message": f"{len(cases)} test details added successfully!"})
+
+
+# 追加一条case结果，args为请求参数或批量上报中的case对象
+def append_test_detail(test_id, args):
+
+    case_name = args.get('case_name')
+    result = args.get('result')
+    time = args.get('time')
+    result_file = args.get('result_file')
+
 
     json_obj = {}
     json_obj["case_name"] = case_name
     json_obj["result"] = result
     json_obj["time"] = time
     json_obj["result_file"] = result_file
-    test_details[test_id].append(json_obj)
-    return jsonify({"message": "test details added successfully!", "new item": json_obj})
+
+    # 其余参数作为case的附加信息一并记录，如进程数、网格数等
+    for key, value in args.items():
+        if key != "test_id" and key not in json_obj:
+            json_obj[key] = value
+    with test_data_lock:
+        save_test_detail(test_id, json_obj)
+        # 该测试已缓存的查询结果失效
+        for key in [key for key in test_details if key[0] == test_id]:
+            del test_details[key]
+    return json_obj
+
+
+# 将已提交的case结果计入监控指标
+def observe_test_detail(args):
+    increase_counter("autotest_cases_total", (("result", args.get('result')),))
+    execution_time = parse_seconds(args.get('time'))
+    if execution_time is not None:
+        observe_histogram("autotest_case_duration_seconds", execution_time)
+    for key, value in args.items():
+        stage_time = parse_seconds(value) if key.startswith("stage_") else None
+        if stage_time is not None:
+            observe_histogram("autotest_stage_duration_seconds", stage_time, (("stage", key[len("stage_"):]),))
 
 
 @app.route("/is_alive/<template_file_name>", methods=['GET'])
 def get_alive(template_file_name):
     g_template_file_name = template_file_name
-    return jsonify({"test_summary_file_path":test_summary_data_file, "test_details_file": test_details_file})
+    return jsonify({"test_summary_file_path":test_summary_data_file, "test_details_file": test_details_file, "test_data_db_file": test_data_db_file})
 
 
 @app.route("/store_test_summary_data", methods=['GET'])
 def store_test_summary_data_interface():
-    global test_summary_data_file
-    store_test_summary_data(test_summary_data_file)
+    store_test_summary_data()
     return jsonify({"message":"store test summary data success"})
 
 
 @app.route("/store_test_details_data", methods=['GET'])
 def store_test_details_data_interface():
-    global test_details_file
-    store_test_details_data(test_details_file)
+    store_test_details_data()
     return jsonify({"message":"store test details data success"})
 
 
 @app.route("/re_load_data", methods=['GET'])
 def re_load_data():
-    global test_summary_data,test_details
-    load_data(test_summary_data_file, test_details_file)
+    load_data()
     return jsonify({"message":"re-load data success"})
 
-# 从落地文件中进行test_summary_data和test_details的加载，目前测试用例的tps不高于0.06，从文件读取性能足够
-def load_data(test_summary_data_file, test_details_file):
-    global test_summary_data,test_details
-    with open(test_summary_data_file, 'r') as f:
-        object = json.load(f)
-        test_summary_data = object["test_summary"]
-
-    with open(test_details_file, 'r') as f:
-        test_details = json.load(f)
 
-def store_test_summary_data(test_summary_data_file):
-    global test_summary_data
-    with open(test_summary_data_file, 'w', encoding='utf-8') as f:
-        object = {}
-        object["test_summary"] = test_summary_data
-        json.dump(object, f, ensure_ascii=False, indent=4)
-
-
-def store_test_details_data(test_details_file):
-    global test_details
-    with open(test_details_file, 'w', encoding='utf-8') as f:
-        json.dump(test_details, f, ensure_ascii=False, indent=4)
+# 清空全部测试数据，用于单次测试开始前的环境清理
+@app.route("/clean_up_data", methods=['GET'])
+def clean_up_data():
+    global test_summary_data,test_details
+    with test_data_lock:
+        db_connection.execute("DELETE FROM test_summary")
+        db_connection.execute("DELETE FROM test_details")
+        db_connection.commit()
+        test_summary_data = {}
+        test_details = OrderedDict()
+    return jsonify({"message":"clean up data success"})
+
+
+# 打开测试数据库，不存在时创建；WAL模式下提交的事务在进程崩溃后不会丢失或损坏，读写互不阻塞
+def open_database(db_file):
+    global db_connection
+    db_connection = sqlite3.connect(db_file, check_same_thread=False)
+    db_connection.execute("PRAGMA journal_mode=WAL")
+    db_connection.execute("PRAGMA synchronous=NORMAL")
+    db_connection.execute("CREATE TABLE IF NOT EXISTS test_summary (name TEXT PRIMARY KEY, data TEXT NOT NULL)")
+    db_connection.execute("CREATE TABLE IF NOT EXISTS test_details (id INTEGER PRIMARY KEY AUTOINCREMENT, test_id TEXT NOT NULL, "
+                          "case_name TEXT, result TEXT, execution_time REAL, error_signature TEXT, data TEXT NOT NULL)")
+    # 旧的数据库没有错误信息字段，从case结果中补充
+    columns = [row[1] for row in db_connection.execute("PRAGMA table_info(test_details)")]
+    if "error_signature" not in columns:
+        db_connection.execute("ALTER TABLE test_details ADD COLUMN error_signature TEXT")
+        db_connection.execute("UPDATE test_details SET error_signature = COALESCE(json_extract(data, '$.abort_reason'), json_extract(data, '$.validation_error'))")
+    # 测试详情按测试id查询，按测试结果过滤，按用时排序
+    db_connection.execute("CREATE INDEX IF NOT EXISTS test_details_test_id ON test_details (test_id)")
+    db_connection.execute("CREATE INDEX IF NOT EXISTS test_details_result ON test_details (test_id, result, execution_time)")
+    db_connection.execute("CREATE INDEX IF NOT EXISTS test_details_time ON test_details (test_id, execution_time)")
+    db_connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    db_connection.commit()
+
+
+# 写入一条测试汇总（已存在时更新，保持原有顺序），由调用的接口提交
+def save_test_summary_item(name, json_obj):
+    with test_data_lock:
+        db_connection.execute("INSERT INTO test_summary (name, data) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET data = excluded.data",
+                              (name, json.dumps(json_obj, ensure_ascii=False)))
+
+
+# 写入一条case结果，由调用的接口提交
+def save_test_detail(test_id, json_obj):
+    with test_data_lock:
+        db_connection.execute("INSERT INTO test_details (test_id, case_name, result, execution_time, error_signature, data) VALUES (?, ?, ?, ?, ?, ?)",
+                              (test_id, json_obj.get("case_name"), json_obj.get("result"), parse_seconds(json_obj.get("time")),
+                               json_obj.get("abort_reason") or json_obj.get("validation_error"), json.dumps(json_obj, ensure_ascii=False)))
+
+
+# 提交尚未落地的测试数据，一次提交中的所有写入要么全部落地要么全部丢弃
+def commit_test_data():
+    with test_data_lock:
+        db_connection.commit()
+
+
+# 从数据库中加载test_summary_data，并清空test_details的缓存，各测试的case结果在查询时再加载
+# 启动用时只与测试数量有关，与case总数无关
+def load_data():
+    global test_summary_data,test_details
+    with test_data_lock:
+        test_summary_data = {name: json.loads(data) for name, data in db_connection.execute("SELECT name, data FROM test_summary ORDER BY rowid")}
+        test_details = OrderedDict()
+
+
+# 解析测试详情的查询参数：page（从1开始）、page_size、sort（id或time）、order（asc或desc）、
+# result（测试结果，如fail、timeout）、signature（错误信息中包含的文字，如终止原因或配置校验错误），参数不合法时抛出ValueError
+def parse_test_details_query(args):
+    query = {"page": int(args.get("page", 1)), "page_size": int(args.get("page_size", test_details_page_size)),
+             "sort": args.get("sort", "id"), "order": args.get("order", "asc"),
+             "result": args.get("result") or None, "signature": args.get("signature") or None}
+    if query["page"] < 1 or not 1 <= query["page_size"] <= test_details_max_page_size:
+        raise ValueError(f"page should be at least 1 and page_size between 1 and {test_details_max_page_size}")
+    if query["sort"] not in test_details_sort_columns:
+        raise ValueError(f"sort should be one of {list(test_details_sort_columns)}")
+    if query["order"] not in ("asc", "desc"):
+        raise ValueError("order should be asc or desc")
+    return query
+
+
+# 查询单个测试的一页case结果、符合条件的case总数以及各测试结果的case数
+# 查询结果缓存在test_details中，超过test_details_cache_size个时淘汰最久未使用的查询
+def query_test_details(test_id, query):
+    key = (test_id, tuple(sorted(query.items())))
+    with test_data_lock:
+        if key in test_details:
+            test_details.move_to_end(key)
+            return test_details[key]
+
+        conditions = ["test_id = ?"]
+        params = [test_id]
+        if query["result"] is not None:
+            conditions.append("result = ?")
+            params.append(query["result"])
+        if query["signature"] is not None:
+            conditions.append("error_signature LIKE ?")
+            params.append(f"%{query['signature']}%")
+        where = " AND ".join(conditions)
+        order = f"{test_details_sort_columns[query['sort']]} {query['order'].upper()}, id"
+
+        total = db_connection.execute(f"SELECT COUNT(*) FROM test_details WHERE {where}", params).fetchone()[0]
+        rows = db_connection.execute(f"SELECT data FROM test_details WHERE {where} ORDER BY {order} LIMIT ? OFFSET ?",
+                                     params + [query["page_size"], (query["page"] - 1) * query["page_size"]])
+        result_counts = dict(db_connection.execute("SELECT result, COUNT(*) FROM test_details WHERE test_id = ? GROUP BY result", (test_id,)))
+        details = {"total": total, "cases": [json.loads(data) for data, in rows], "result_counts": result_counts}
+
+        test_details[key] = details
+        while len(test_details) > test_details_cache_size:
+            test_details.popitem(last=False)
+        return details
+
+
+# 将旧的json落地文件导入数据库，只在首次启动时导入一次，文件不存在或为空时跳过
+def import_json_data(test_summary_data_file, test_details_file):
+    with test_data_lock:
+        if db_connection.execute("SELECT value FROM meta WHERE key = 'json_imported'").fetchone() is not None:
+            return
+        summary_count = 0
+        case_count = 0
+        if os.path.isfile(test_summary_data_file):
+            with open(test_summary_data_file, 'r') as f:
+                object = json.load(f)
+            for name, json_obj in object.get("test_summary", {}).items():
+                save_test_summary_item(name, json_obj)
+                summary_count = summary_count + 1
+        if os.path.isfile(test_details_file):
+            with open(test_details_file, 'r') as f:
+                object = json.load(f)
+            for test_id, cases in object.items():
+                for json_obj in cases:
+                    save_test_detail(test_id, json_obj)
+                    case_count = case_count + 1
+        db_connection.execute("INSERT INTO meta (key, value) VALUES ('json_imported', ?)", (time.strftime("%Y-%m-%d %H:%M:%S"),))
+        db_connection.commit()
+    print(f"imported {summary_count} test summaries and {case_count} test details from json files")
+
+
+def store_test_summary_data():
+    commit_test_data()
+
+
+def store_test_details_data():
+    commit_test_data()
 
 
 if __name__ == '__main__':
@@ -175,6 +668,13 @@ if __name__ == '__main__':
     argv = sys.argv
     test_summary_data_file = os.path.abspath(argv[1])
     test_details_file = os.path.abspath(argv[2])
-    load_data(test_summary_data_file, test_details_file)
+    # 数据库文件默认与落地文件位于同一文件夹
+    test_data_db_file = os.path.abspath(argv[3]) if len(argv) > 3 else os.path.join(os.path.dirname(test_details_file), "test_data.db")
+    # 第四个参数为最多缓存的case结果查询数
+    if len(argv) > 4:
+        test_details_cache_size = int(argv[4])
+    open_database(test_data_db_file)
+    import_json_data(test_summary_data_file, test_details_file)
+    load_data()
 
     app.run(host='0.0.0.0', port=5000, debug=True)